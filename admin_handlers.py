@@ -11,9 +11,41 @@ from menu_handlers import show_admin_menu
 
 import datetime
 import logging
+import mysql.connector
+
+from database import (
+    delete_game,
+    delete_player,
+    execute,
+    fetch_one,
+    get_pool_stats,
+    insert_games,
+    recount_occupancy,
+    run_db
+)
+from config import ADMIN_USERNAMES, IMPORT_MAX_BYTES
+from player_cache import invalidate_all_players, invalidate_player
+from schedule_cache import schedule_snapshot
+from notifications import notification_queue
+from pickers import game_picker, player_picker
+from game_templates import occurrences, parse_template
+from player_import import import_players
+from exports import EXPORTS, write_export
+from broadcast import (
+    USAGE as BROADCAST_USAGE,
+    broadcast_runner,
+    count_recipients,
+    create_job,
+    describe,
+    parse_broadcast,
+    progress_text,
+    recent_jobs,
+    set_status
+)
+from callbacks import callback_args, make_callback, make_signed_callback
+from text_input import clear_input_state, set_input_state
 
-from database import connect_db, get_player_by_nickname
-from config import ADMIN_USERNAMES
+logger = logging.getLogger(__name__)
 
 # Conversation states
 ADD_GAME_DATE, ADD_GAME_START_TIME, ADD_GAME_END_TIME, ADD_GAME_VENUE, ADD_GAME_CAPACITY = range(5)
@@ -88,24 +120,20 @@ async def add_game_capacity(update: Update, context: ContextTypes.DEFAULT_TYPE):
     venue = context.user_data['venue']
 
     # Save the new game to the database
-    conn = connect_db()
-    cursor = conn.cursor()
-
     try:
-        cursor.execute('''
+        await execute('''
             INSERT INTO schedule (event_date, start_time, end_time, venue, capacity)
             VALUES (%s, %s, %s, %s, %s)
         ''', (event_date, start_time, end_time, venue, capacity))
-        conn.commit()
+        await schedule_snapshot.refresh()
         await update.message.reply_text("The new game has been added successfully.")
         
         await show_admin_menu(update, context)
 
+    except mysql.connector.IntegrityError:
+        await update.message.reply_text("A game at this venue, date and start time already exists.")
     except Exception as e:
         await update.message.reply_text(f"An error occurred while adding the game: {e}")
-    finally:
-        cursor.close()
-        conn.close()
 
     # Clear user data and end the conversation
     context.user_data.clear()
@@ -123,28 +151,14 @@ async def remove_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("You do not have permission to remove games.")
         return
 
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, event_date, start_time, venue FROM schedule WHERE finished IS NULL")
-    games = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    picker = await game_picker('remove')
 
-    if not games:
+    if picker is None:
         await update.message.reply_text("There are no unfinished games to remove.")
         return
 
-    buttons = []
-    for game in games:
-        game_id = game[0]
-        event_date = game[1]
-        start_time = game[2]
-        venue = game[3]
-        button_text = f"{game_id}: {venue} on {event_date} at {start_time}"
-        buttons.append([InlineKeyboardButton(button_text, callback_data=f"remove_game_{game_id}")])
-
-    reply_markup = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("Select a game to remove:", reply_markup=reply_markup)
+    text, reply_markup = picker
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 #handle remove game
 async def handle_remove_game_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -156,34 +170,20 @@ async def handle_remove_game_callback(update: Update, context: ContextTypes.DEFA
         await query.edit_message_text("You do not have permission to remove games.")
         return
 
-    game_id = int(query.data.split('_')[-1])
-    context.user_data['remove_game_id'] = game_id
+    game_id, = callback_args(context)
 
-    # Fetch game details and number of registered players
-    conn = connect_db()
-    cursor = conn.cursor()
-
-    # Get game details
-    cursor.execute("SELECT event_date, start_time, end_time, venue FROM schedule WHERE id = %s", (game_id,))
-    game = cursor.fetchone()
+    # Get game details and number of registered players
+    game = await fetch_one("SELECT event_date, start_time, end_time, venue, main_count + waiting_count FROM schedule WHERE id = %s", (game_id,))
 
     if not game:
         await query.edit_message_text("Game not found.")
-        cursor.close()
-        conn.close()
         return
 
     event_date = game[0]
     start_time = game[1]
     end_time = game[2]
     venue = game[3]
-
-    # Get number of registered players
-    cursor.execute("SELECT COUNT(*) FROM registrations WHERE game_id = %s", (game_id,))
-    num_players = cursor.fetchone()[0]
-
-    cursor.close()
-    conn.close()
+    num_players = game[4]
 
     # Prepare confirmation message
     message = (f"Are you sure you want to remove the game at {venue} on {event_date} from {start_time} to {end_time}?\n"
@@ -192,8 +192,8 @@ async def handle_remove_game_callback(update: Update, context: ContextTypes.DEFA
 
     # Provide Yes/No buttons
     buttons = [
-        [InlineKeyboardButton("Yes", callback_data='confirm_remove_yes'),
-         InlineKeyboardButton("No", callback_data='confirm_remove_no')]
+        [InlineKeyboardButton("Yes", callback_data=make_signed_callback('confirm_remove_game', query.from_user.id, game_id, 'yes')),
+         InlineKeyboardButton("No", callback_data=make_signed_callback('confirm_remove_game', query.from_user.id, game_id, 'no'))]
     ]
     reply_markup = InlineKeyboardMarkup(buttons)
 
@@ -210,32 +210,16 @@ async def handle_remove_confirmation_callback(update: Update, context: ContextTy
         await query.edit_message_text("You do not have permission to remove games.")
         return
 
-    confirmation = query.data.split('_')[-1]
-    game_id = context.user_data.get('remove_game_id')
+    game_id, confirmation = callback_args(context)
 
     if confirmation == 'yes':
-        # Proceed to remove the game
-        conn = connect_db()
-        cursor = conn.cursor()
-
-        # Delete registrations associated with the game
-        cursor.execute("DELETE FROM registrations WHERE game_id = %s", (game_id,))
-
-        # Delete the game
-        cursor.execute("DELETE FROM schedule WHERE id = %s", (game_id,))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Remove the game and its registrations
+        await run_db(delete_game, game_id)
+        await schedule_snapshot.refresh()
 
         await query.edit_message_text("The game has been successfully removed.")
-
-        # Clear the remove game ID from context
-        context.user_data.pop('remove_game_id', None)
     else:
         await query.edit_message_text("Game removal canceled.")
-        # Clear the remove game ID from context
-        context.user_data.pop('remove_game_id', None)
 
 
 #Add Player Handler
@@ -247,6 +231,7 @@ async def add_player_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text("Enter the player's name:")
     context.user_data['add_player_step'] = 'name'
+    set_input_state(context, 'add_player')
 
 #Handle Player Addition Steps
 async def handle_add_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -257,10 +242,12 @@ async def handle_add_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if step == 'name':
         context.user_data['player_name'] = update.message.text
         context.user_data['add_player_step'] = 'nickname'
+        set_input_state(context, 'add_player')
         await update.message.reply_text("Enter the player's Telegram nickname:")
     elif step == 'nickname':
         context.user_data['player_nickname'] = update.message.text
         context.user_data['add_player_step'] = 'level'
+        set_input_state(context, 'add_player')
         await update.message.reply_text("Enter the player's level (Novice, D-, D, D+, C-, C, C+):")
     elif step == 'level':
         level = update.message.text
@@ -273,22 +260,17 @@ async def handle_add_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
         player_nickname = context.user_data.get('player_nickname')
 
         # Save the new player to the database
-        conn = connect_db()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute('''INSERT INTO players (name, nickname, level)
-                              VALUES (%s, %s, %s)''', (player_name, player_nickname, level))
-            conn.commit()
+            await execute('''INSERT INTO players (name, nickname, level)
+                             VALUES (%s, %s, %s)''', (player_name, player_nickname, level))
+            invalidate_player(nickname=player_nickname)
             await update.message.reply_text(f"Player {player_name} ({player_nickname}) has been added successfully.")
         except mysql.connector.IntegrityError:
             await update.message.reply_text(f"A player with the nickname {player_nickname} already exists.")
-        finally:
-            cursor.close()
-            conn.close()
 
         # Clear user data
         context.user_data.pop('add_player_step', None)
+        clear_input_state(context)
         context.user_data.pop('player_name', None)
         context.user_data.pop('player_nickname', None)
     else:
@@ -303,27 +285,16 @@ async def edit_player_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("You do not have permission to edit players.")
         return
 
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, nickname FROM players WHERE active = TRUE")
-    players = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    # Optional search prefix, e.g. "Edit Player ann"
+    prefix = update.message.text.partition(' Player')[2].strip()
+    picker = await player_picker('edit', prefix=prefix)
 
-    if not players:
+    if picker is None:
         await update.message.reply_text("There are no players to edit.")
         return
 
-    buttons = []
-    for player in players:
-        player_id = player[0]
-        name = player[1]
-        nickname = player[2]
-        button_text = f"{player_id}: {name} ({nickname})"
-        buttons.append([InlineKeyboardButton(button_text, callback_data=f"edit_player_{player_id}")])
-
-    reply_markup = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("Select a player to edit:", reply_markup=reply_markup)
+    text, reply_markup = picker
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 #Handle Player Selection for Editing
 async def handle_edit_player_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -335,14 +306,14 @@ async def handle_edit_player_callback(update: Update, context: ContextTypes.DEFA
         await query.edit_message_text("You do not have permission to edit players.")
         return
 
-    player_id = int(query.data.split('_')[-1])
+    player_id, = callback_args(context)
     context.user_data['edit_player_id'] = player_id
 
     keyboard = [
-        [InlineKeyboardButton("Name", callback_data='edit_player_attr_name')],
-        [InlineKeyboardButton("Nickname", callback_data='edit_player_attr_nickname')],
-        [InlineKeyboardButton("Level", callback_data='edit_player_attr_level')],
-        [InlineKeyboardButton("Cancel", callback_data='edit_player_attr_cancel')]
+        [InlineKeyboardButton("Name", callback_data=make_callback('edit_player_attr', 'name'))],
+        [InlineKeyboardButton("Nickname", callback_data=make_callback('edit_player_attr', 'nickname'))],
+        [InlineKeyboardButton("Level", callback_data=make_callback('edit_player_attr', 'level'))],
+        [InlineKeyboardButton("Cancel", callback_data=make_callback('edit_player_attr', 'cancel'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Select an attribute to edit:", reply_markup=reply_markup)
@@ -352,7 +323,7 @@ async def handle_edit_player_attribute_callback(update: Update, context: Context
     query = update.callback_query
     await query.answer()
 
-    attribute = query.data.split('_')[-1]
+    attribute, = callback_args(context)
     context.user_data['edit_player_attribute'] = attribute
 
     if attribute == 'cancel':
@@ -374,6 +345,7 @@ async def handle_edit_player_attribute_callback(update: Update, context: Context
 
     await query.edit_message_text(prompt)
     context.user_data['edit_player_step'] = 'update_attribute'
+    set_input_state(context, 'edit_player_attribute')
 
 #Handle New Attribute Value
 async def handle_new_player_attribute_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -409,25 +381,20 @@ async def handle_new_player_attribute_value(update: Update, context: ContextType
         return  # Do not proceed if validation failed
 
     # Update the database
-    conn = connect_db()
-    cursor = conn.cursor()
-
     try:
         update_query = f"UPDATE players SET {attribute} = %s WHERE id = %s"
-        cursor.execute(update_query, (new_value, player_id))
-        conn.commit()
+        await execute(update_query, (new_value, player_id))
+        invalidate_player(player_id=player_id, nickname=new_value if attribute == 'nickname' else None)
         await update.message.reply_text(f"The player's {attribute} has been updated successfully.")
     except mysql.connector.IntegrityError:
         if attribute == 'nickname':
             await update.message.reply_text(f"A player with the nickname {new_value} already exists.")
-    finally:
-        cursor.close()
-        conn.close()
 
     # Clear the editing state
     context.user_data.pop('edit_player_id', None)
     context.user_data.pop('edit_player_attribute', None)
     context.user_data.pop('edit_player_step', None)
+    clear_input_state(context)
 
 
 #Remove Player Handler
@@ -437,27 +404,16 @@ async def remove_player_start(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("You do not have permission to remove players.")
         return
 
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, nickname FROM players WHERE active = TRUE")
-    players = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    # Optional search prefix, e.g. "Remove Player ann"
+    prefix = update.message.text.partition(' Player')[2].strip()
+    picker = await player_picker('remove', prefix=prefix)
 
-    if not players:
+    if picker is None:
         await update.message.reply_text("There are no players to remove.")
         return
 
-    buttons = []
-    for player in players:
-        player_id = player[0]
-        name = player[1]
-        nickname = player[2]
-        button_text = f"{player_id}: {name} ({nickname})"
-        buttons.append([InlineKeyboardButton(button_text, callback_data=f"remove_player_{player_id}")])
-
-    reply_markup = InlineKeyboardMarkup(buttons)
-    await update.message.reply_text("Select a player to remove:", reply_markup=reply_markup)
+    text, reply_markup = picker
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 #Handle Player Selection for Removal
 async def handle_remove_player_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -469,20 +425,13 @@ async def handle_remove_player_callback(update: Update, context: ContextTypes.DE
         await query.edit_message_text("You do not have permission to remove players.")
         return
 
-    player_id = int(query.data.split('_')[-1])
-    context.user_data['remove_player_id'] = player_id
+    player_id, = callback_args(context)
 
     # Fetch player details
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, nickname FROM players WHERE id = %s", (player_id,))
-    player = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    player = await fetch_one("SELECT name, nickname FROM players WHERE id = %s", (player_id,))
 
     if not player:
         await query.edit_message_text("Player not found.")
-        context.user_data.pop('remove_player_id', None)
         return
 
     name = player[0]
@@ -494,8 +443,8 @@ async def handle_remove_player_callback(update: Update, context: ContextTypes.DE
 
     # Provide Yes/No buttons
     buttons = [
-        [InlineKeyboardButton("Yes", callback_data='confirm_remove_player_yes'),
-         InlineKeyboardButton("No", callback_data='confirm_remove_player_no')]
+        [InlineKeyboardButton("Yes", callback_data=make_signed_callback('confirm_remove_player', query.from_user.id, player_id, 'yes')),
+         InlineKeyboardButton("No", callback_data=make_signed_callback('confirm_remove_player', query.from_user.id, player_id, 'no'))]
     ]
     reply_markup = InlineKeyboardMarkup(buttons)
 
@@ -511,32 +460,16 @@ async def handle_remove_player_confirmation_callback(update: Update, context: Co
         await query.edit_message_text("You do not have permission to remove players.")
         return
 
-    confirmation = query.data.split('_')[-1]
-    player_id = context.user_data.get('remove_player_id')
+    player_id, confirmation = callback_args(context)
 
     if confirmation == 'yes':
-        # Proceed to remove the player
-        conn = connect_db()
-        cursor = conn.cursor()
-
-        # Delete registrations associated with the player
-        cursor.execute("DELETE FROM registrations WHERE player_id = %s", (player_id,))
-
-        # Delete the player
-        cursor.execute("DELETE FROM players WHERE id = %s", (player_id,))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Remove the player and their registrations
+        await run_db(delete_player, player_id)
+        invalidate_player(player_id=player_id)
 
         await query.edit_message_text("The player has been successfully removed.")
-
-        # Clear the remove player ID from context
-        context.user_data.pop('remove_player_id', None)
     else:
         await query.edit_message_text("Player removal canceled.")
-        # Clear the remove player ID from context
-        context.user_data.pop('remove_player_id', None)
 
 
 #handle_edit_game_callback function
@@ -549,120 +482,52 @@ async def handle_edit_game_callback(update: Update, context: ContextTypes.DEFAUL
         await query.edit_message_text("You do not have permission to edit games.")
         return
 
-    game_id = int(query.data.split('_')[-1])
+    game_id, = callback_args(context)
     context.user_data['edit_game_id'] = game_id
 
     keyboard = [
-        [InlineKeyboardButton("Event Date", callback_data='edit_attr_event_date')],
-        [InlineKeyboardButton("Start Time", callback_data='edit_attr_start_time')],
-        [InlineKeyboardButton("End Time", callback_data='edit_attr_end_time')],
-        [InlineKeyboardButton("Venue", callback_data='edit_attr_venue')],
-        [InlineKeyboardButton("Capacity", callback_data='edit_attr_capacity')],
-        [InlineKeyboardButton("Cancel", callback_data='edit_attr_cancel')]
+        [InlineKeyboardButton("Event Date", callback_data=make_callback('edit_attr', 'event_date'))],
+        [InlineKeyboardButton("Start Time", callback_data=make_callback('edit_attr', 'start_time'))],
+        [InlineKeyboardButton("End Time", callback_data=make_callback('edit_attr', 'end_time'))],
+        [InlineKeyboardButton("Venue", callback_data=make_callback('edit_attr', 'venue'))],
+        [InlineKeyboardButton("Capacity", callback_data=make_callback('edit_attr', 'capacity'))],
+        [InlineKeyboardButton("Cancel", callback_data=make_callback('edit_attr', 'cancel'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Select an attribute to edit:", reply_markup=reply_markup)
+    return SELECT_ATTRIBUTE_TO_EDIT
 
 #edit_existing_game function
 async def edit_existing_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        conn = connect_db()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, 
-                   DATE_FORMAT(event_date, '%Y-%m-%d') AS event_date_str, 
-                   TIME_FORMAT(start_time, '%H:%i') AS start_time_str, 
-                   TIME_FORMAT(end_time, '%H:%i') AS end_time_str, 
-                   venue 
-            FROM schedule 
-            ORDER BY event_date DESC
-        """)
-        games = cursor.fetchall()
-        if not games:
+        picker = await game_picker('edit')
+        if picker is None:
             await update.message.reply_text("No games available to edit.")
             return ConversationHandler.END
 
-        keyboard = []
-        for game in games:
-            event_date = game['event_date_str']
-            start_time = game['start_time_str']
-            end_time = game['end_time_str']
-            venue = game['venue']
-
-            button_text = f"{event_date} {start_time} - {end_time} - {venue}"
-            callback_data = f"edit_game_{game['id']}"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text("Select a game to edit:", reply_markup=reply_markup)
+        text, reply_markup = picker
+        await update.message.reply_text(text, reply_markup=reply_markup)
         return SELECT_GAME_TO_EDIT  # Proceed to the next state
 
     except Exception as e:
         logger.exception("Error fetching games")
         await update.message.reply_text("An error occurred while fetching games.")
         return ConversationHandler.END
-
-    finally:
-        cursor.close()
-        conn.close()
     
 
-#Handle Game Creation Steps
-async def handle_game_creation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    step = context.user_data.get('game_creation_step')
-
-    if step == 'event_date':
-        context.user_data['event_date'] = update.message.text
-        context.user_data['game_creation_step'] = 'start_time'
-        await update.message.reply_text("Enter the start time (HH:MM):")
-    elif step == 'start_time':
-        context.user_data['start_time'] = update.message.text
-        context.user_data['game_creation_step'] = 'end_time'
-        await update.message.reply_text("Enter the end time (HH:MM):")
-    elif step == 'end_time':
-        context.user_data['end_time'] = update.message.text
-        context.user_data['game_creation_step'] = 'venue'
-        await update.message.reply_text("Enter the venue:")
-    elif step == 'venue':
-        context.user_data['venue'] = update.message.text
-        context.user_data['game_creation_step'] = 'capacity'
-        await update.message.reply_text("Enter the capacity:")
-    elif step == 'capacity':
-        capacity = update.message.text
-        try:
-            capacity = int(capacity)
-            event_date = context.user_data['event_date']
-            start_time = context.user_data['start_time']
-            end_time = context.user_data['end_time']
-            venue = context.user_data['venue']
-
-            conn = connect_db()
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO schedule (event_date, start_time, end_time, venue, capacity)
-                              VALUES (%s, %s, %s, %s, %s)''',
-                           (event_date, start_time, end_time, venue, capacity))
-            conn.commit()
-            cursor.close()
-            conn.close()
-
-            await update.message.reply_text("New game has been added successfully.")
-            context.user_data.clear()
-        except ValueError:
-            await update.message.reply_text("Invalid capacity. Please enter a number.")
-
 #Handle Attribute Selection            
 async def handle_edit_attribute_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    attribute = query.data.split('_')[-1]
+    attribute, = callback_args(context)
     context.user_data['edit_attribute'] = attribute
 
     if attribute == 'cancel':
         await query.edit_message_text("Editing canceled.")
         context.user_data.pop('edit_game_id', None)
         context.user_data.pop('edit_attribute', None)
-        return
+        return ConversationHandler.END
 
     attribute_prompts = {
         'event_date': "Enter the new event date (YYYY-MM-DD):",
@@ -679,6 +544,8 @@ async def handle_edit_attribute_callback(update: Update, context: ContextTypes.D
 
     await query.edit_message_text(prompt)
     context.user_data['edit_step'] = 'update_attribute'
+    set_input_state(context, 'edit_game_attribute')
+    return EDIT_GAME_ATTRIBUTE_VALUE
 
 async def edit_game_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("edit_game_cancel function called")
@@ -690,22 +557,198 @@ async def handle_new_attribute_value(update: Update, context: ContextTypes.DEFAU
     game_id = context.user_data['edit_game_id']
     attribute = context.user_data['edit_attribute']
 
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
     try:
         # Build the SQL query dynamically
         sql = f"UPDATE schedule SET {attribute} = %s WHERE id = %s"
-        cursor.execute(sql, (new_value, game_id))
-        conn.commit()
+        await execute(sql, (new_value, game_id))
+        await schedule_snapshot.refresh()
         await update.message.reply_text("Game updated successfully.")
     except Exception as e:
         logger.exception("Error updating game")
         await update.message.reply_text("An error occurred while updating the game.")
-    finally:
-        cursor.close()
-        conn.close()
 
     # Clear user data and end the conversation
     context.user_data.clear()
     return ConversationHandler.END
-#
\ No newline at end of file
+#
+#Database pool stats
+async def show_pool_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to view database stats.")
+        return
+
+    stats = get_pool_stats()
+    message = "Database pool:\n" + "\n".join(f"{key}: {value}" for key, value in stats.items())
+    await update.message.reply_text(message)
+
+#Recompute game occupancy counters
+async def recount_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to recount games.")
+        return
+
+    try:
+        updated = await run_db(recount_occupancy)
+        await update.message.reply_text(f"Occupancy counters recomputed. {updated} game(s) corrected.")
+    except Exception:
+        logger.exception("Error recounting games")
+        await update.message.reply_text("An error occurred while recounting games.")
+
+#Notification queue stats
+async def show_notification_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to view notification stats.")
+        return
+
+    stats = notification_queue.stats()
+    message = "Notifications:\n" + "\n".join(f"{key}: {value}" for key, value in stats.items())
+    await update.message.reply_text(message)
+
+#Create a recurring series of games in one batch
+async def create_recurring_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to add games.")
+        return
+
+    try:
+        template = parse_template(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    games = occurrences(template, datetime.date.today())
+    try:
+        created = await run_db(insert_games, games)
+    except Exception:
+        logger.exception("Error creating recurring games")
+        await update.message.reply_text("An error occurred while creating the games. No games were added.")
+        return
+
+    # One snapshot reload for the whole series
+    if created:
+        await schedule_snapshot.refresh()
+    skipped = len(games) - created
+    message = f"Created {created} game(s) at {template['venue']}."
+    if skipped:
+        message += f" Skipped {skipped} already scheduled."
+    await update.message.reply_text(message)
+
+#Bulk import players from an uploaded CSV document
+async def import_players_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to import players.")
+        return
+
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"The file is too large. The limit is {IMPORT_MAX_BYTES // 1024} KB.")
+        return
+
+    file = await document.get_file()
+    data = bytes(await file.download_as_bytearray())
+    try:
+        inserted, updated, errors = await run_db(import_players, data)
+    except UnicodeDecodeError:
+        await update.message.reply_text("The file is not valid UTF-8 text. Please export it as a UTF-8 CSV.")
+        return
+    except Exception:
+        logger.exception("Error importing players")
+        await update.message.reply_text("An error occurred while importing players. No players were changed.")
+        return
+
+    # Names and levels may have changed for any cached player
+    invalidate_all_players()
+    message = f"Import finished: {inserted} player(s) added, {updated} updated, {len(errors)} row(s) rejected."
+    if errors:
+        message += "\n" + "\n".join(f"Line {line_no}: {error}" for line_no, error in errors[:20])
+        if len(errors) > 20:
+            message += f"\n... and {len(errors) - 20} more."
+    await update.message.reply_text(message)
+
+#Export games, rosters or registration history as a CSV document
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to export data.")
+        return
+
+    args = [arg.lower() for arg in context.args or []]
+    name = args[0] if args else None
+    compress = 'gz' in args[1:]
+    if name not in EXPORTS:
+        await update.message.reply_text(f"Usage: /export <{'|'.join(EXPORTS)}> [gz]")
+        return
+
+    try:
+        output, rows = await run_db(write_export, name, compress)
+    except Exception:
+        logger.exception(f"Error exporting {name}")
+        await update.message.reply_text("An error occurred while exporting.")
+        return
+
+    filename = f"{name}_{datetime.date.today().isoformat()}.csv" + ('.gz' if compress else '')
+    with output:
+        await update.message.reply_document(document=output, filename=filename, caption=f"{rows} row(s)")
+
+#Broadcast a message to players in the background, or check on / pause / resume / cancel broadcasts
+async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user.username
+    if user not in ADMIN_USERNAMES:
+        await update.message.reply_text("You do not have permission to broadcast messages.")
+        return
+
+    args = [arg.lower() for arg in context.args or []]
+    action = args[0] if args else None
+    if action == 'status':
+        jobs = await recent_jobs()
+        await update.message.reply_text("\n".join(progress_text(job) for job in jobs) or "No recent broadcasts.")
+        return
+    if action in ('pause', 'resume', 'cancel'):
+        if len(args) < 2 or not args[1].isdigit():
+            await update.message.reply_text(BROADCAST_USAGE)
+            return
+        job_id = int(args[1])
+        if action == 'resume':
+            moved = await set_status(job_id, 'running', ('paused',))
+            if moved:
+                await broadcast_runner.resume(job_id)
+        else:
+            moved = await set_status(job_id, 'paused' if action == 'pause' else 'cancelled',
+                                     ('running',) if action == 'pause' else ('running', 'paused'))
+            # A task on another worker stops before its next message and saves its position there
+            await broadcast_runner.stop_local(job_id)
+        if moved:
+            await update.message.reply_text(f"Broadcast #{job_id}: {action} done.")
+        else:
+            await update.message.reply_text(f"Broadcast #{job_id} cannot be {action}d from its current state.")
+        return
+
+    try:
+        target, text = parse_broadcast(update.message.text)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    try:
+        total, skipped = await count_recipients(target)
+        # Players added by an admin or by CSV import get a Telegram account once they use the bot
+        unreachable = f" {skipped} player(s) without a Telegram account are skipped." if skipped else ""
+        if not total:
+            await update.message.reply_text(f"There is nobody to send to among {describe(target)}.{unreachable}")
+            return
+        status_message = await update.message.reply_text(
+            f"Starting a broadcast to {describe(target)} ({total} player(s)).{unreachable}"
+        )
+        job = await run_db(create_job, target, text, update.effective_chat.id, status_message.message_id, total)
+    except Exception:
+        logger.exception("Error starting broadcast")
+        await update.message.reply_text("An error occurred while starting the broadcast. Nothing was sent.")
+        return
+
+    # Sending happens in the background; progress is edited into the status message
+    broadcast_runner.run(job)
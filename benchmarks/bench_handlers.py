@@ -0,0 +1,247 @@
+# benchmarks/bench_handlers.py
+#
+# End-to-end handler benchmark: feeds synthetic Updates through the real Application
+# from bot.build_application(), with Bot API calls answered in-process by
+# fake_telegram.FakeBotApi and data in a throwaway MySQL database.
+#
+#     python benchmarks/bench_handlers.py --db padel_bench --players 200
+#     python benchmarks/bench_handlers.py --db padel_bench --compare benchmarks/results/baseline.json
+#
+# The benchmark database is dropped and recreated on every run, so never point it at real data.
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector
+from telegram import Update
+from telegram.request import BaseRequest
+
+import database
+from bot import build_application
+from config import ADMIN_USERNAMES
+from callbacks import make_signed_callback
+from migrate import apply_pending
+from fake_telegram import FakeBotApi, make_callback_update, make_message_update
+from notifications import start_notifications, stop_notifications
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class FakeRequest(BaseRequest):
+    """PTB request backend that answers every Bot API call from FakeBotApi without any network I/O."""
+
+    def __init__(self, api):
+        self.api = api
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        params = request_data.parameters if request_data else {}
+        result = self.api.handle(url.rsplit('/', 1)[-1], params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def reset_database(db_name):
+    server_config = {key: value for key, value in database.DB_CONFIG.items() if key != 'database'}
+    conn = mysql.connector.connect(**server_config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+    cursor.execute(f"CREATE DATABASE `{db_name}`")
+    cursor.execute(f"USE `{db_name}`")
+    cursor.close()
+    # Same schema and indexes as production
+    apply_pending(conn)
+    conn.close()
+
+
+def server_questions():
+    """Total statements the MySQL server has executed; the difference across a flow counts its queries."""
+    conn = database.connect_db()
+    cursor = conn.cursor()
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    value = int(cursor.fetchone()[1])
+    cursor.close()
+    conn.close()
+    return value
+
+
+def summarize(name, latencies, elapsed, queries):
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'flow': name,
+        'updates': len(latencies),
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'queries_per_update': round(queries / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+async def run_flow(application, name, updates):
+    """Process updates one after another, timing each. Returns the flow summary."""
+    latencies = []
+    # One extra statement is the status query itself
+    questions_before = server_questions() + 1
+    started = time.perf_counter()
+    for data in updates:
+        update = Update.de_json(data, application.bot)
+        t0 = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    queries = server_questions() - questions_before
+    return summarize(name, latencies, elapsed, queries)
+
+
+def player_registration_updates(players):
+    updates = []
+    for i in range(players):
+        user_id, username = 10_000 + i, f"player{i}"
+        updates.append(make_message_update(user_id, username, 'Register'))
+        updates.append(make_message_update(user_id, username, f"Player {i}"))
+        updates.append(make_message_update(user_id, username, 'C'))
+    return updates
+
+
+def admin_game_creation_updates(games, admin_id=1, admin=ADMIN_USERNAMES[0]):
+    updates = []
+    first_day = datetime.date.today() + datetime.timedelta(days=1)
+    for i in range(games):
+        day = first_day + datetime.timedelta(days=i)
+        for text in ('Add New Game', day.isoformat(), '19:00', '21:00', f"Court {i % 3}", '4'):
+            updates.append(make_message_update(admin_id, admin, text))
+    return updates
+
+
+def fetch_ids(query):
+    conn = database.connect_db()
+    cursor = conn.cursor()
+    cursor.execute(query)
+    rows = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return rows
+
+
+async def run_benchmark(args):
+    reset_database(args.db)
+    api = FakeBotApi()
+    # Same write-behind SQLite persistence as production, in a scratch file
+    state_dir = tempfile.mkdtemp(prefix='padel_bench_')
+    application = build_application(
+        token='123456:BENCHMARK',
+        base_url=None,
+        persistence_path=os.path.join(state_dir, 'state.sqlite3'),
+        request_factory=lambda: FakeRequest(api),
+    )
+
+    results = []
+    try:
+        async with application:
+            await start_notifications(application)
+
+            results.append(await run_flow(application, 'admin_game_creation', admin_game_creation_updates(args.games)))
+            results.append(await run_flow(application, 'player_registration', player_registration_updates(args.players)))
+
+            game_ids = fetch_ids("SELECT id FROM schedule ORDER BY id")
+            register_updates = [
+                make_callback_update(10_000 + i, f"player{i}", f"register_game:{game_ids[i % len(game_ids)]}")
+                for i in range(args.players)
+            ]
+            results.append(await run_flow(application, 'register_game', register_updates))
+
+            # Cancel main-list registrations on games with a waiting list, promoting the next player
+            cancellations = fetch_ids("""
+                SELECT r.id FROM registrations r
+                JOIN schedule s ON s.id = r.game_id
+                WHERE r.waiting = FALSE AND s.waiting_count > 0
+            """)
+            owners = {}
+            conn = database.connect_db()
+            cursor = conn.cursor()
+            cursor.execute("SELECT r.id, r.game_id, p.id, p.nickname FROM registrations r JOIN players p ON p.id = r.player_id")
+            for reg_id, game_id, player_id, nickname in cursor.fetchall():
+                # Synthetic players are named player<i> and use Telegram id 10000 + i
+                owners[reg_id] = (10_000 + int(nickname[len('player'):]), nickname, player_id, game_id)
+            cursor.close()
+            conn.close()
+            cancel_updates = []
+            for reg_id in cancellations:
+                user_id, nickname, player_id, game_id = owners[reg_id]
+                data = make_signed_callback('cancel_reg', user_id, reg_id, player_id, game_id)
+                cancel_updates.append(make_callback_update(user_id, nickname, data))
+            if cancel_updates:
+                results.append(await run_flow(application, 'cancel_with_promotion', cancel_updates))
+
+            await stop_notifications(application)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'players': args.players,
+        'games': args.games,
+        'bot_api_calls': len(api.calls),
+        'flows': results,
+    }
+
+
+def print_report(report, baseline=None):
+    previous = {flow['flow']: flow for flow in baseline['flows']} if baseline else {}
+    print(f"{'flow':<24}{'updates':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'upd/s':>10}{'q/upd':>8}")
+    for flow in report['flows']:
+        print(f"{flow['flow']:<24}{flow['updates']:>8}{flow['p50_ms']:>10}{flow['p95_ms']:>10}"
+              f"{flow['p99_ms']:>10}{flow['throughput_per_s']:>10}{flow['queries_per_update']:>8}")
+        before = previous.get(flow['flow'])
+        if before:
+            print(f"{'  vs baseline':<24}{'':>8}{flow['p50_ms'] / before['p50_ms']:>9.2f}x"
+                  f"{flow['p95_ms'] / before['p95_ms']:>9.2f}x{flow['p99_ms'] / before['p99_ms']:>9.2f}x"
+                  f"{flow['throughput_per_s'] / before['throughput_per_s']:>9.2f}x"
+                  f"{flow['queries_per_update'] - before['queries_per_update']:>+8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PadelBot handlers end to end")
+    parser.add_argument('--db', required=True, help="scratch MySQL database to (re)create, e.g. padel_bench")
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--output', help="where to save the JSON results (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Point the shared pool at the scratch database before anything connects
+    database.pool.db_config['database'] = args.db
+
+    report = asyncio.run(run_benchmark(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,14 @@
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
+    Application,
     ApplicationBuilder, 
     CommandHandler, 
     MessageHandler, 
     CallbackQueryHandler, 
     ContextTypes, 
     filters,
-    ConversationHandler
+    ConversationHandler,
+    TypeHandler
     )
 
 from admin_handlers import (
@@ -31,7 +33,6 @@ from admin_handlers import (
     handle_edit_player_callback, 
     handle_edit_player_attribute_callback,
     handle_edit_game_callback,
-    handle_game_creation,
     handle_new_attribute_value,
     handle_new_player_attribute_value,
     handle_remove_confirmation_callback, 
@@ -42,7 +43,14 @@ from admin_handlers import (
     SELECT_ATTRIBUTE_TO_EDIT,
     EDIT_GAME_ATTRIBUTE_VALUE,    
     remove_game, 
-    remove_player_start
+    remove_player_start,
+    show_pool_stats,
+    show_notification_stats,
+    recount_games,
+    create_recurring_games,
+    import_players_document,
+    export_data,
+    broadcast_message
 
 )
     
@@ -66,7 +74,7 @@ from player_handlers import (
     handle_cancel_registration_callback,
     list_confirmed_registrations_for_swap,
     handle_swap_registration_callback,
-    handle_registration,
+    handle_registration as handle_player_registration,
     register_player,
     handle_game_selection
     )
@@ -78,8 +86,40 @@ from registration_handlers import (
     REGISTER_LEVEL
 )
     
+from player_cache import resolve_player
+from text_input import text_input_dispatcher
+from pickers import handle_games_page, handle_players_page
+from callbacks import CallbackRouter
+from notifications import start_notifications, stop_notifications, notification_queue
+from broadcast import broadcast_runner, start_broadcasts, stop_broadcasts
+from database import get_pool_stats
+import metrics
 from utils import is_admin, is_registered_player
-from config import TOKEN
+from config import (
+    TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    TELEGRAM_API_URL,
+    PERSISTENCE_PATH,
+    PERSISTENCE_INTERVAL,
+    METRICS_HOST,
+    METRICS_PORT,
+    MAX_CONCURRENT_UPDATES,
+    MAX_QUEUED_UPDATES_PER_USER,
+    SHARED_STORE,
+    WORKER_INDEX,
+    WORKER_BASE_PORT,
+    CALLBACK_DEDUP_WINDOW,
+    TEXT_INPUT_EDIT_TIMEOUT,
+    TEXT_INPUT_REGISTRATION_TIMEOUT
+)
+from concurrency import PerUserUpdateProcessor
+from persistence import SQLitePersistence, SharedStorePersistence
+from shared_store import start_shared_store, stop_shared_store, store
 
 import logging
 
@@ -88,11 +128,103 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-def main():
-    application = ApplicationBuilder().token(TOKEN).build()
+class InstrumentedApplication(Application):
+    """Application that records total latency and SQL statement count for every update."""
+
+    async def process_update(self, update):
+        token = metrics.begin_update()
+        try:
+            await super().process_update(update)
+        finally:
+            metrics.end_update(token)
+
+
+def instrument_handlers(application, callback_router):
+    """Time every registered handler callback, including router routes and text input steps."""
+    def wrap(handler):
+        handler.callback = metrics.timed_handler(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                for inner in handler.entry_points + handler.fallbacks:
+                    wrap(inner)
+                for state_handlers in handler.states.values():
+                    for inner in state_handlers:
+                        wrap(inner)
+            else:
+                wrap(handler)
+    callback_router.instrument(metrics.timed_handler)
+    text_input_dispatcher.instrument(metrics.timed_handler)
+
+    metrics.register_gauge('padelbot_db_pool', "Connection pool counters.", get_pool_stats)
+    metrics.register_gauge('padelbot_notifications', "Notification queue counters.", notification_queue.stats)
+    metrics.register_gauge('padelbot_broadcasts', "Broadcast jobs running here and messages they queued.",
+                           broadcast_runner.stats)
+    metrics.register_gauge('padelbot_callback_duplicates', "Repeated button taps dropped by the callback router.",
+                           lambda: callback_router.duplicates)
+
+
+async def on_startup(application):
+    await start_shared_store(application)
+    await start_notifications(application)
+    await start_broadcasts(application)
+    if METRICS_PORT:
+        # Each worker of a scaled-out deployment gets its own metrics port
+        await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT + (WORKER_INDEX or 0))
+
+
+async def on_shutdown(application):
+    await metrics.stop_metrics_server()
+    await stop_broadcasts(application)
+    await stop_notifications(application)
+    await stop_shared_store(application)
+
+
+def build_application(token=TOKEN, base_url=TELEGRAM_API_URL, persistence_path=PERSISTENCE_PATH, request_factory=None):
+    """Build the Application with every handler registered, without starting it.
+
+    request_factory, if given, builds the Bot API request backends (used by the benchmarks).
+    """
+    builder = (
+        ApplicationBuilder()
+        .application_class(InstrumentedApplication)
+        .token(token)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if request_factory:
+        builder = builder.request(request_factory()).get_updates_request(request_factory())
+    if MAX_CONCURRENT_UPDATES > 1:
+        update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES_PER_USER)
+        builder = builder.concurrent_updates(update_processor)
+        metrics.register_gauge('padelbot_users_in_flight', "Users with an update being processed or queued.",
+                               update_processor.pending_users)
+    if SHARED_STORE == 'mysql':
+        # In-flight flows live in the shared store, where every worker can reach them
+        builder = builder.persistence(SharedStorePersistence(store, PERSISTENCE_INTERVAL))
+    elif persistence_path:
+        # In-flight flows (user_data and conversation states) survive restarts
+        builder = builder.persistence(SQLitePersistence(persistence_path, PERSISTENCE_INTERVAL))
+    application = builder.build()
+    # Conversations can only be persistent when a persistence backend is attached
+    persistent = application.persistence is not None
+
+    callback_router = CallbackRouter(fallback=button, dedup_window=CALLBACK_DEDUP_WINDOW)
+
+    # Resolve the sender's player row once per update, before any other handler runs
+    application.add_handler(TypeHandler(Update, resolve_player), group=-1)
 
     # Command Handlers
     application.add_handler(CommandHandler('start', start))
+    application.add_handler(CommandHandler('dbstats', show_pool_stats))
+    application.add_handler(CommandHandler('recount_games', recount_games))
+    application.add_handler(CommandHandler('notifystats', show_notification_stats))
+    application.add_handler(CommandHandler('recurring_games', create_recurring_games))
+    application.add_handler(CommandHandler('export', export_data))
+    application.add_handler(CommandHandler('broadcast', broadcast_message))
     
     # Conversation handler for adding a new game
     add_new_game_handler = ConversationHandler(
@@ -105,17 +237,21 @@ def main():
             ADD_GAME_CAPACITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_game_capacity)],
         },
         fallbacks=[CommandHandler('cancel', add_game_cancel)],
+        name='add_new_game',
+        persistent=persistent,
     )
 
     # Conversation handler for editing a game
     edit_game_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.Regex('^Edit Existing Game$'), edit_existing_game)],
         states={
-            SELECT_GAME_TO_EDIT: [CallbackQueryHandler(handle_edit_game_callback, pattern='^edit_game_\\d+$')],
-            SELECT_ATTRIBUTE_TO_EDIT: [CallbackQueryHandler(handle_edit_attribute_callback, pattern='^edit_attribute_.*$')],
+            SELECT_GAME_TO_EDIT: [CallbackQueryHandler(callback_router.dispatch, pattern='^(edit_game|games_page):')],
+            SELECT_ATTRIBUTE_TO_EDIT: [CallbackQueryHandler(callback_router.dispatch, pattern='^edit_attr:')],
             EDIT_GAME_ATTRIBUTE_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_attribute_value)],
         },
         fallbacks=[CommandHandler('cancel', edit_game_cancel)],
+        name='edit_game',
+        persistent=persistent,
     )
     #registration handler
     registration_handler = ConversationHandler(
@@ -125,50 +261,36 @@ def main():
             REGISTER_LEVEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_registration)],
         },
         fallbacks=[],
+        name='registration',
+        persistent=persistent,
     )
-    async def test_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=f"Callback data received: {query.data}"
-    )    
     application.add_handler(edit_game_handler)
 
     application.add_handler(add_new_game_handler)
-
-    # Callback Query Handlers
-    application.add_handler(CallbackQueryHandler(button))
-    application.add_handler(CommandHandler('start', start))
     application.add_handler(registration_handler)
-#    application.add_handler(CallbackQueryHandler(fallback_callback))
 
-    application.add_handler(CallbackQueryHandler(test_callback, pattern='.*'))
-    application.add_handler(CallbackQueryHandler(handle_game_selection, pattern='^select_game_\\d+$'))
-    
-    application.add_handler(CallbackQueryHandler(handle_register_game_callback, pattern=r'^register_game_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_confirm_registration_callback, pattern=r'^confirm_registration_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_cancel_registration_callback, pattern=r'^cancel_registration_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_swap_registration_callback, pattern=r'^swap_registration_\d+$'))
-#    application.add_handler(CallbackQueryHandler(handle_edit_game_callback, pattern=r'^edit_game_\d+$'))
-#    application.add_handler(CallbackQueryHandler(handle_edit_attribute_callback, pattern=r'^edit_attr_.*'))
-    application.add_handler(CallbackQueryHandler(handle_remove_game_callback, pattern=r'^remove_game_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_remove_confirmation_callback, pattern=r'^confirm_remove_.*'))
-
-    application.add_handler(CallbackQueryHandler(handle_edit_player_callback, pattern=r'^edit_player_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_edit_player_attribute_callback, pattern=r'^edit_player_attr_.*'))
-    application.add_handler(CallbackQueryHandler(handle_remove_player_callback, pattern=r'^remove_player_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_remove_player_confirmation_callback, pattern=r'^confirm_remove_player_.*'))
-
-    application.add_handler(CallbackQueryHandler(handle_edit_game_callback, pattern=r'^edit_game_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_remove_game_callback, pattern=r'^remove_game_\d+$'))
-    application.add_handler(CallbackQueryHandler(handle_remove_confirmation_callback, pattern=r'^confirm_remove_.*'))
-    application.add_handler(CallbackQueryHandler(handle_add_player, pattern=r'^add_player\d+$'))                    # ?
-    application.add_handler(CallbackQueryHandler(handle_register_game_callback, pattern=r'^register_to_game\d+$'))  # ?
-    application.add_handler(CallbackQueryHandler(handle_registration, pattern=r'^register\d+$'))                    # ?
-    application.add_handler(CallbackQueryHandler(handle_game_creation, pattern=r'^create_new_game\d+$'))                    # ?
+    # Callback Query Handlers: one router keyed on the callback_data prefix
+    callback_router.add('select_game', handle_game_selection, int)
+    callback_router.add('register_game', handle_register_game_callback, int, idempotent=True)
+    callback_router.add('confirm_registration', handle_confirm_registration_callback, int, int, signed=True, idempotent=True)
+    # Short prefix: three ids, the owner and the signature must fit in 64 bytes
+    callback_router.add('cancel_reg', handle_cancel_registration_callback, int, int, int, signed=True, idempotent=True)
+    callback_router.add('swap_registration', handle_swap_registration_callback, int, int, signed=True, idempotent=True)
+
+    callback_router.add('edit_game', handle_edit_game_callback, int)
+    callback_router.add('edit_attr', handle_edit_attribute_callback, str)
+    callback_router.add('remove_game', handle_remove_game_callback, int)
+    callback_router.add('confirm_remove_game', handle_remove_confirmation_callback, int, str, signed=True, idempotent=True)
+    callback_router.add('games_page', handle_games_page, str, str, str, str, int)
+
+    callback_router.add('edit_player', handle_edit_player_callback, int)
+    callback_router.add('edit_player_attr', handle_edit_player_attribute_callback, str)
+    callback_router.add('remove_player', handle_remove_player_callback, int)
+    callback_router.add('confirm_remove_player', handle_remove_player_confirmation_callback, int, str, signed=True, idempotent=True)
+    callback_router.add('players_page', handle_players_page, str, str, int, str)
+
+    application.add_handler(CallbackQueryHandler(callback_router.dispatch))
 
-    
 # Message Handlers 
     application.add_handler(MessageHandler(filters.Regex('^Manage Games$'), show_manage_games_menu))
     application.add_handler(MessageHandler(filters.Regex('^Add New Game$'), add_new_game_start))
@@ -179,10 +301,7 @@ def main():
 
 #    application.add_handler(MessageHandler(filters.Regex('^Manage Games Schedule$'), show_manage_games_menu))
 
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_game_creation))
-
     application.add_handler(MessageHandler(filters.Regex('^Register$'), register_player))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_registration))
 
 
     application.add_handler(MessageHandler(filters.Regex('^Confirm Registration for the Game$'), list_unconfirmed_registrations))
@@ -191,22 +310,58 @@ def main():
     application.add_handler(MessageHandler(filters.Regex('^Swap Your Confirmed Registration$'), list_confirmed_registrations_for_swap))
     application.add_handler(MessageHandler(filters.Regex('^Manage Players$'), manage_players_menu))
     application.add_handler(MessageHandler(filters.Regex('^Add Player$'), add_player_start))
-    application.add_handler(MessageHandler(filters.Regex('^Edit Player$'), edit_player_start))
-    application.add_handler(MessageHandler(filters.Regex('^Remove Player$'), remove_player_start))
-
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_add_player))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_player_attribute_value))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_attribute_value))
+    application.add_handler(MessageHandler(filters.Regex('^Edit Player( .+)?$'), edit_player_start))
+    application.add_handler(MessageHandler(filters.Regex('^Remove Player( .+)?$'), remove_player_start))
 
     application.add_handler(MessageHandler(filters.Regex('^Edit Existing Game$'), edit_existing_game))
     application.add_handler(MessageHandler(filters.Regex('^Remove Game$'), remove_game))
 
     application.add_handler(MessageHandler(filters.Regex('^Back to Admin Menu$'), show_admin_menu))
 
+    # Admin CSV upload: name,nickname,level per line
+    application.add_handler(MessageHandler(filters.Document.FileExtension('csv'), import_players_document))
+
+    # Free-text input: one dispatcher routes to the step the user is in, after all menu buttons
+    text_input_dispatcher.register('player_registration', handle_player_registration,
+                                   timeout=TEXT_INPUT_REGISTRATION_TIMEOUT)
+    text_input_dispatcher.register('add_player', handle_add_player, timeout=TEXT_INPUT_EDIT_TIMEOUT)
+    text_input_dispatcher.register('edit_player_attribute', handle_new_player_attribute_value,
+                                   timeout=TEXT_INPUT_EDIT_TIMEOUT)
+    text_input_dispatcher.register('edit_game_attribute', handle_new_attribute_value,
+                                   timeout=TEXT_INPUT_EDIT_TIMEOUT)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_input_dispatcher.dispatch))
+
     # ... other handlers ...
 
-    application.run_polling()
+    callback_router.check(application)
+    instrument_handlers(application, callback_router)
+
+    return application
+
+
+def main():
+    application = build_application()
 
+    if WORKER_INDEX is not None:
+        # Behind ingress.py: Telegram posts to the ingress at WEBHOOK_URL, which hands each user's updates to one worker
+        application.run_webhook(
+            listen='127.0.0.1',
+            port=WORKER_BASE_PORT + WORKER_INDEX,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+        )
+    elif BOT_MODE == 'webhook':
+        # Plain HTTP listener; TLS is expected to terminate at the reverse proxy in front of it
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+        )
+    else:
+        application.run_polling()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,356 @@
+# broadcast.py
+#
+# Admin broadcasts to every player, one level, or one game's roster:
+#
+#     /broadcast all <text>
+#     /broadcast level <level> <text>
+#     /broadcast game <id> [main|waiting|confirmed] <text>
+#     /broadcast status | pause <id> | resume <id> | cancel <id>
+#
+# A broadcast is a row in the broadcasts table (migration 0005) and a background
+# task that streams recipients in player id order, feeds them to the notification
+# queue at BROADCAST_RATE and saves its position after every chunk and whenever
+# it stops.
+
+import asyncio
+import logging
+import time
+
+from telegram.error import TelegramError
+
+from config import (
+    BROADCAST_RATE,
+    BROADCAST_CHUNK_SIZE,
+    BROADCAST_MAX_BACKLOG,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_STALE_AFTER,
+    WORKER_ID,
+    WORKER_INDEX,
+)
+from database import connect_db, execute, fetch_all, fetch_one
+from notifications import notification_queue, notify
+from player_import import VALID_LEVELS
+
+logger = logging.getLogger(__name__)
+
+USAGE = (
+    "Usage:\n"
+    "/broadcast all <text>\n"
+    "/broadcast level <level> <text>\n"
+    "/broadcast game <id> [main|waiting|confirmed] <text>\n"
+    "/broadcast status | pause <id> | resume <id> | cancel <id>"
+)
+
+# roster -> extra condition on the game's registrations
+ROSTERS = {
+    'all': '',
+    'main': ' AND r.waiting = FALSE',
+    'waiting': ' AND r.waiting = TRUE',
+    'confirmed': ' AND r.confirmed = TRUE',
+}
+
+JOB_COLUMNS = "id, audience, level, game_id, roster, text, admin_chat_id, status_message_id, total, queued, last_player_id, status, owner"
+
+
+def _take_word(text):
+    """Split off the first word; the rest keeps its line breaks."""
+    parts = text.split(None, 1)
+    return (parts[0], parts[1] if len(parts) > 1 else '') if parts else ('', '')
+
+
+def parse_broadcast(message_text):
+    """Split '/broadcast <audience...> <text>' into (audience dict, text). Raises ValueError with the usage."""
+    _, rest = _take_word(message_text)
+    audience, rest = _take_word(rest)
+    audience = audience.lower()
+    if audience == 'all':
+        target = {'audience': 'all', 'level': None, 'game_id': None, 'roster': None}
+    elif audience == 'level':
+        level, rest = _take_word(rest)
+        if level not in VALID_LEVELS:
+            raise ValueError(f"Unknown level {level!r}, expected one of {', '.join(VALID_LEVELS)}")
+        target = {'audience': 'level', 'level': level, 'game_id': None, 'roster': None}
+    elif audience == 'game':
+        game_id, rest = _take_word(rest)
+        if not game_id.isdigit():
+            raise ValueError(USAGE)
+        roster = 'all'
+        word, remainder = _take_word(rest)
+        if word.lower() in ROSTERS and remainder:
+            roster, rest = word.lower(), remainder
+        target = {'audience': 'game', 'level': None, 'game_id': int(game_id), 'roster': roster}
+    else:
+        raise ValueError(USAGE)
+    if not rest.strip():
+        raise ValueError(USAGE)
+    return target, rest
+
+
+def describe(job):
+    if job['audience'] == 'level':
+        return f"level {job['level']} players"
+    if job['audience'] == 'game':
+        roster = '' if job['roster'] == 'all' else f"{job['roster']} "
+        return f"the {roster}roster of game {job['game_id']}"
+    return "all players"
+
+
+def _audience_clause(job):
+    """Return (FROM ... WHERE ..., params) selecting the job's audience as p."""
+    if job['audience'] == 'game':
+        return ("FROM registrations r JOIN players p ON p.id = r.player_id "
+                "WHERE r.game_id = %s" + ROSTERS[job['roster']]), (job['game_id'],)
+    if job['audience'] == 'level':
+        return "FROM players p WHERE p.active = TRUE AND p.level = %s", (job['level'],)
+    return "FROM players p WHERE p.active = TRUE", ()
+
+
+async def count_recipients(job):
+    """Return (reachable, skipped): players in the audience with and without a known Telegram account."""
+    clause, params = _audience_clause(job)
+    audience, reachable = await fetch_one(f"SELECT COUNT(*), COUNT(p.telegram_id) {clause}", params, readonly=True)
+    return reachable, audience - reachable
+
+
+async def next_recipients(job, chunk_size):
+    """Next chunk of (player_id, telegram_id) after the job's resume point, skipping players without a Telegram account."""
+    clause, params = _audience_clause(job)
+    return await fetch_all(
+        f"SELECT p.id, p.telegram_id {clause} AND p.telegram_id IS NOT NULL AND p.id > %s ORDER BY p.id LIMIT %s",
+        params + (job['last_player_id'], chunk_size),
+        readonly=True
+    )
+
+
+def create_job(target, text, admin_chat_id, status_message_id, total):
+    """Insert a running broadcast owned by this worker. Blocking; run it via run_db. Returns the job dict."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO broadcasts (audience, level, game_id, roster, text, admin_chat_id, status_message_id, total, owner) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (target['audience'], target['level'], target['game_id'], target['roster'],
+             text, admin_chat_id, status_message_id, total, WORKER_ID)
+        )
+        conn.commit()
+        job_id = cursor.lastrowid
+    finally:
+        cursor.close()
+        conn.close()
+    return dict(target, id=job_id, text=text, admin_chat_id=admin_chat_id, status_message_id=status_message_id,
+                total=total, queued=0, last_player_id=0, status='running', owner=WORKER_ID)
+
+
+async def load_job(job_id):
+    return await fetch_one(f"SELECT {JOB_COLUMNS} FROM broadcasts WHERE id = %s", (job_id,), dictionary=True)
+
+
+async def recent_jobs(limit=10):
+    """Unfinished broadcasts and those from the last day, newest first."""
+    return await fetch_all(
+        f"SELECT {JOB_COLUMNS} FROM broadcasts "
+        "WHERE status IN ('running', 'paused') OR created_at > NOW() - INTERVAL 1 DAY ORDER BY id DESC LIMIT %s",
+        (limit,), dictionary=True
+    )
+
+
+async def set_status(job_id, status, from_statuses):
+    """Move a job to ``status`` if it is in one of ``from_statuses``. Returns True if it moved.
+
+    The owner is kept: the worker sending the job notices the change before its
+    next message and saves its exact position under that ownership.
+    """
+    placeholders = ', '.join(['%s'] * len(from_statuses))
+    return bool(await execute(
+        f"UPDATE broadcasts SET status = %s WHERE id = %s AND status IN ({placeholders})",
+        (status, job_id) + tuple(from_statuses)
+    ))
+
+
+async def claim_job(job_id):
+    await execute("UPDATE broadcasts SET owner = %s WHERE id = %s AND status = 'running'", (WORKER_ID, job_id))
+
+
+async def is_running_here(job_id):
+    """True while the job is running and owned by this worker; read from the primary."""
+    row = await fetch_one("SELECT status, owner FROM broadcasts WHERE id = %s", (job_id,))
+    return row is not None and row[0] == 'running' and row[1] == WORKER_ID
+
+
+async def save_progress(job):
+    """Store the job's resume point, whatever its status, unless another worker has taken it over."""
+    await execute(
+        "UPDATE broadcasts SET queued = %s, last_player_id = %s WHERE id = %s AND owner = %s",
+        (job['queued'], job['last_player_id'], job['id'], WORKER_ID)
+    )
+
+
+async def finish_job(job):
+    await execute(
+        "UPDATE broadcasts SET queued = %s, last_player_id = %s, status = 'done' "
+        "WHERE id = %s AND status = 'running' AND owner = %s",
+        (job['queued'], job['last_player_id'], job['id'], WORKER_ID)
+    )
+
+
+def progress_text(job):
+    return f"Broadcast #{job['id']} to {describe(job)}: {job['queued']}/{job['total']} queued ({job['status']})."
+
+
+class BroadcastRunner:
+    """Runs broadcast jobs as background tasks, one per job.
+
+    Each job waits while the notification queue holds ``max_backlog`` messages
+    and otherwise queues one message every 1/``rate`` seconds, so a large
+    broadcast never crowds out waitlist notifications. Before each message the
+    task checks that the job is still running and owned by this worker, so a
+    pause or cancel issued on any worker stops it within one message. Progress
+    is saved after every chunk and when the task stops.
+    """
+
+    def __init__(self, rate, chunk_size, max_backlog, progress_interval, stale_after):
+        self.interval = 1.0 / rate
+        self.chunk_size = chunk_size
+        self.max_backlog = max_backlog
+        self.progress_interval = progress_interval
+        self.stale_after = stale_after
+        self._tasks = {}  # job id -> task
+        self._sweeper = None
+        self._bot = None
+        self.queued = 0
+
+    def start(self, bot):
+        self._bot = bot
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {'running': len(self._tasks), 'queued': self.queued}
+
+    def run(self, job):
+        if job['id'] in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job['id']] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job['id'], None))
+
+    async def stop_local(self, job_id):
+        """Stop the job's task on this worker, if any, once its resume point is saved."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def resume(self, job_id):
+        """Restart a job set back to running if this worker owns it; otherwise its owner's sweep picks it up.
+
+        Taking a job over from a live owner could overlap with the message that
+        owner is queueing just now, so only a single process claims it outright.
+        """
+        if WORKER_INDEX is None:
+            await claim_job(job_id)
+        job = await load_job(job_id)
+        if job is not None and job['owner'] == WORKER_ID:
+            self.run(job)
+
+    async def _sweep(self):
+        # A single process owns every running job; workers only take over jobs nobody has saved for a while
+        stale_after = 0 if WORKER_INDEX is None else self.stale_after
+        while True:
+            try:
+                # Also the heartbeat for this worker's own jobs
+                await execute(
+                    "UPDATE broadcasts SET owner = %s, updated_at = NOW() WHERE status = 'running' "
+                    "AND (owner = %s OR updated_at < NOW() - INTERVAL %s SECOND)",
+                    (WORKER_ID, WORKER_ID, int(stale_after))
+                )
+                rows = await fetch_all(
+                    f"SELECT {JOB_COLUMNS} FROM broadcasts WHERE status = 'running' AND owner = %s",
+                    (WORKER_ID,), dictionary=True
+                )
+                for job in rows:
+                    if job['id'] not in self._tasks:
+                        logger.info(f"Resuming broadcast #{job['id']} after player {job['last_player_id']}")
+                        self.run(job)
+            except Exception:
+                logger.exception("Failed to look for broadcasts to resume")
+            stale_after = self.stale_after
+            await asyncio.sleep(self.stale_after / 2)
+
+    async def _run(self, job):
+        last_report = 0.0
+        try:
+            while True:
+                chunk = await next_recipients(job, self.chunk_size)
+                if not chunk:
+                    job['status'] = 'done'
+                    await finish_job(job)
+                    break
+                for player_id, telegram_id in chunk:
+                    while notification_queue.stats()['queued'] >= self.max_backlog:
+                        await asyncio.sleep(self.interval)
+                    if not await is_running_here(job['id']):
+                        await save_progress(job)
+                        logger.info(f"Broadcast #{job['id']} stopped after player {job['last_player_id']}: "
+                                    "no longer running here")
+                        return
+                    notify(telegram_id, job['text'], dedup_key=f"broadcast:{job['id']}")
+                    job['queued'] += 1
+                    job['last_player_id'] = player_id
+                    self.queued += 1
+                    await asyncio.sleep(self.interval)
+                await self._save(job)
+                if time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    await self._report(job)
+        except asyncio.CancelledError:
+            # Shutdown, or a pause or cancel on this worker: keep the exact resume point
+            await asyncio.shield(self._save(job))
+            raise
+        except Exception:
+            logger.exception(f"Broadcast #{job['id']} failed; it resumes on the next sweep")
+            await self._save(job)
+            return
+        await self._report(job)
+
+    async def _save(self, job):
+        try:
+            await save_progress(job)
+        except Exception:
+            logger.exception(f"Failed to save progress of broadcast #{job['id']}")
+
+    async def _report(self, job):
+        if not job['status_message_id']:
+            return
+        try:
+            await self._bot.edit_message_text(progress_text(job), chat_id=job['admin_chat_id'],
+                                              message_id=job['status_message_id'])
+        except TelegramError as e:
+            logger.debug(f"Could not update progress of broadcast #{job['id']}: {e}")
+
+
+broadcast_runner = BroadcastRunner(
+    BROADCAST_RATE,
+    BROADCAST_CHUNK_SIZE,
+    BROADCAST_MAX_BACKLOG,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_STALE_AFTER,
+)
+
+
+async def start_broadcasts(application):
+    broadcast_runner.start(application.bot)
+
+
+async def stop_broadcasts(application):
+    await broadcast_runner.stop()
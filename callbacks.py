@@ -0,0 +1,252 @@
+# callbacks.py
+
+import base64
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+from config import CALLBACK_SECRET
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_SEP = ':'
+MAX_CALLBACK_DATA = 64  # bytes, enforced by Telegram
+# Bump when the signed layout changes; buttons from older versions are rejected as stale
+SIGNED_CALLBACK_VERSION = '1'
+SIGNATURE_BYTES = 8
+_SIGNING_KEY = hashlib.sha256(CALLBACK_SECRET.encode('utf-8')).digest()
+_BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def make_callback(prefix, *args):
+    """Build structured callback_data: '<prefix>:<arg>:<arg>...'."""
+    data = CALLBACK_SEP.join([prefix, *(str(arg) for arg in args)])
+    if len(data.encode('utf-8')) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data longer than {MAX_CALLBACK_DATA} bytes: {data!r}")
+    return data
+
+
+def _to_base36(number):
+    if number < 0:
+        return '-' + _to_base36(-number)
+    digits = ''
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _BASE36[digit] + digits
+        if not number:
+            return digits
+
+
+def _sign(payload):
+    digest = hmac.new(_SIGNING_KEY, payload.encode('utf-8'), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def make_signed_callback(prefix, owner_id, *args):
+    """Build tamper-proof callback_data bound to the Telegram user allowed to press it.
+
+    Layout: '<prefix>:<version>:<arg>...:<owner>:<signature>', with integers in
+    base 36 to stay well inside Telegram's 64 bytes. Routes registered with
+    signed=True verify it before the handler runs, so handlers can trust the ids.
+    """
+    encoded = [_to_base36(arg) if isinstance(arg, int) else str(arg) for arg in args]
+    for arg in encoded:
+        if CALLBACK_SEP in arg:
+            raise ValueError(f"Signed callback argument may not contain {CALLBACK_SEP!r}: {arg!r}")
+    payload = CALLBACK_SEP.join([prefix, SIGNED_CALLBACK_VERSION, *encoded, _to_base36(owner_id)])
+    return make_callback(payload, _sign(payload))
+
+
+def _parse_signed(rest, prefix, arg_types):
+    """Verify the signed part of callback_data; return (args, owner_id). Raises ValueError."""
+    fields = rest.split(CALLBACK_SEP)
+    if len(fields) != len(arg_types) + 3 or fields[0] != SIGNED_CALLBACK_VERSION:
+        raise ValueError("Unknown signed callback layout")
+    payload = CALLBACK_SEP.join([prefix, *fields[:-1]])
+    if not hmac.compare_digest(fields[-1], _sign(payload)):
+        raise ValueError("Bad callback signature")
+    args = tuple(int(raw, 36) if arg_type is int else arg_type(raw)
+                 for arg_type, raw in zip(arg_types, fields[1:-2]))
+    return args, int(fields[-2], 36)
+
+
+class DedupWindow:
+    """Remembers keys for ``window`` seconds after they are added."""
+
+    def __init__(self, window, maxsize=10000):
+        self.window = window
+        self.maxsize = maxsize
+        self._expires = OrderedDict()  # key -> expires_at; the window is fixed, so oldest first
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._expires and next(iter(self._expires.values())) < now:
+            self._expires.popitem(last=False)
+
+    def __contains__(self, key):
+        self._expire()
+        return key in self._expires
+
+    def add(self, key):
+        self._expire()
+        self._expires.pop(key, None)
+        self._expires[key] = time.monotonic() + self.window
+        if len(self._expires) > self.maxsize:
+            self._expires.popitem(last=False)
+
+    def forget(self, key):
+        self._expires.pop(key, None)
+
+
+class CallbackRouter:
+    """Dispatch callback queries by the prefix of their callback_data with a single dict lookup.
+
+    Each route declares the types of its arguments; the last argument receives
+    the remainder of the data, so it may itself contain the separator. Parsed
+    arguments are handed to the handler as context.callback_args.
+
+    Routes added with signed=True only accept data from make_signed_callback(),
+    and only from the Telegram user it was made for.
+
+    With a dedup window, a callback query Telegram delivers twice is handled
+    once, and on routes added with idempotent=True so is a user tapping the
+    same button again within the window. A tap whose handler raises is
+    forgotten, so the user can retry it straight away.
+    """
+
+    def __init__(self, fallback=None, dedup_window=0):
+        self.fallback = fallback
+        self._routes = {}
+        self._dedup = DedupWindow(dedup_window) if dedup_window > 0 else None
+        self.duplicates = 0
+        self.problems = []
+
+    def add(self, prefix, handler, *arg_types, signed=False, idempotent=False):
+        if not prefix or CALLBACK_SEP in prefix:
+            self.problems.append(f"Invalid callback prefix {prefix!r} for {handler.__name__}")
+            return
+        if prefix in self._routes:
+            existing = self._routes[prefix][0]
+            self.problems.append(
+                f"Duplicate callback route {prefix!r}: {handler.__name__} is shadowed by {existing.__name__}"
+            )
+            return
+        self._routes[prefix] = (handler, arg_types, signed, idempotent)
+
+    def prefixes(self):
+        return set(self._routes)
+
+    def instrument(self, wrap):
+        """Replace every route handler with wrap(handler), e.g. to time it."""
+        self._routes = {prefix: (wrap(handler), *route) for prefix, (handler, *route) in self._routes.items()}
+
+    def parse(self, data, user_id=None):
+        """Return (handler, args) for callback_data, or (None, None) if it matches no route.
+
+        Raises ValueError for malformed data, and PermissionError when signed data
+        was issued to someone other than ``user_id``.
+        """
+        prefix, _, rest = data.partition(CALLBACK_SEP)
+        route = self._routes.get(prefix)
+        if route is None:
+            return None, None
+        handler, arg_types, signed, _ = route
+        if signed:
+            args, owner_id = _parse_signed(rest, prefix, arg_types)
+            if owner_id != user_id:
+                raise PermissionError(f"Callback {prefix!r} issued to {owner_id}, pressed by {user_id}")
+            return handler, args
+        if not arg_types:
+            return handler, ()
+        raw_args = rest.split(CALLBACK_SEP, len(arg_types) - 1)
+        if len(raw_args) != len(arg_types):
+            raise ValueError(f"Expected {len(arg_types)} argument(s) in {data!r}")
+        return handler, tuple(arg_type(raw) for arg_type, raw in zip(arg_types, raw_args))
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        try:
+            handler, args = self.parse(query.data or '', query.from_user.id)
+        except PermissionError as e:
+            logger.warning(str(e))
+            await query.answer("This button belongs to someone else.")
+            return None
+        except ValueError:
+            logger.warning(f"Malformed callback data: {query.data!r}")
+            await query.answer("This button is no longer valid.")
+            return None
+
+        if handler is None:
+            if self.fallback is not None:
+                return await self.fallback(update, context)
+            logger.warning(f"No route for callback data: {query.data!r}")
+            await query.answer()
+            return None
+
+        keys = self._dedup_keys(query)
+        if any(key in self._dedup for key in keys):
+            self.duplicates += 1
+            await query.answer("Already processing this, one moment.")
+            return None
+
+        for key in keys:
+            self._dedup.add(key)
+        context.callback_args = args
+        try:
+            return await handler(update, context)
+        except Exception:
+            for key in keys:
+                self._dedup.forget(key)
+            raise
+
+    def _dedup_keys(self, query):
+        """Keys under which this tap is remembered: its query id, plus user and data on idempotent routes."""
+        if self._dedup is None:
+            return []
+        keys = [('query', query.id)]
+        data = query.data or ''
+        route = self._routes.get(data.partition(CALLBACK_SEP)[0])
+        if route and route[3]:
+            keys.append(('tap', query.from_user.id, data))
+        return keys
+
+    def check(self, application):
+        """Report duplicate routes and callback handlers that can never see the router's queries.
+
+        Returns the list of problems found; each is also logged at startup.
+        """
+        problems = list(self.problems)
+        for group, handlers in application.handlers.items():
+            router_seen = False
+            for handler in handlers:
+                if not isinstance(handler, CallbackQueryHandler):
+                    continue
+                if getattr(handler.callback, '__wrapped__', handler.callback) == self.dispatch:
+                    router_seen = True
+                    continue
+                name = getattr(handler.callback, '__name__', repr(handler.callback))
+                if handler.pattern is None:
+                    if router_seen:
+                        problems.append(f"Catch-all callback handler {name} in group {group} is unreachable behind the router")
+                    else:
+                        problems.append(f"Catch-all callback handler {name} in group {group} shadows the router")
+                    continue
+                if not hasattr(handler.pattern, 'match'):
+                    continue
+                for prefix in self._routes:
+                    if handler.pattern.match(prefix + CALLBACK_SEP):
+                        where = "unreachable behind" if router_seen else "shadows"
+                        problems.append(f"Callback handler {name} in group {group} {where} route {prefix!r}")
+        for problem in problems:
+            logger.error(problem)
+        return problems
+
+
+def callback_args(context: ContextTypes.DEFAULT_TYPE):
+    """Arguments parsed by the router for the current callback query."""
+    return getattr(context, 'callback_args', ())
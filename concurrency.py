@@ -0,0 +1,111 @@
+# concurrency.py
+
+import asyncio
+import collections
+import contextlib
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedLocks:
+    """asyncio locks created on demand per key and dropped once nobody holds or waits for them.
+
+    Waiters are served in arrival order, so work queued under one key runs in sequence.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, holders and waiters]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+# Serializes capacity-critical writes per game inside this process, so concurrent
+# registrations queue here instead of each holding a pooled connection while
+# they wait on the game's row lock in MySQL
+game_locks = KeyedLocks()
+
+
+def ordering_key(update):
+    """Updates sharing a key are processed one at a time, in the order they arrived."""
+    if isinstance(update, Update):
+        if update.effective_user:
+            return ('user', update.effective_user.id)
+        if update.effective_chat:
+            return ('chat', update.effective_chat.id)
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Run updates from different users concurrently while keeping each user's updates in order.
+
+    The first update from a user runs in one of the ``max_concurrent_updates``
+    slots; updates the user sends meanwhile are queued behind it and run in the
+    same slot, in arrival order, while their own slots are released at once. A
+    user sending many messages therefore occupies at most one slot, and updates
+    beyond ``max_queued_per_user`` waiting behind a running one are dropped.
+    """
+
+    def __init__(self, max_concurrent_updates, max_queued_per_user):
+        super().__init__(max_concurrent_updates)
+        self.max_queued_per_user = max_queued_per_user
+        self._queues = {}  # ordering key -> coroutines waiting behind the one running
+        self.dropped = 0
+
+    async def do_process_update(self, update, coroutine):
+        key = ordering_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            if len(queue) >= self.max_queued_per_user:
+                self.dropped += 1
+                coroutine.close()
+                logger.warning(f"Dropping update from {key}: {len(queue)} already queued")
+                return
+            queue.append(coroutine)
+            return
+
+        queue = self._queues[key] = collections.deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception:
+                    logger.exception(f"Error processing update from {key}")
+                if not queue:
+                    break
+                coroutine = queue.popleft()
+        finally:
+            del self._queues[key]
+            for pending in queue:
+                pending.close()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def pending_users(self):
+        return len(self._queues)
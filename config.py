@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -15,3 +16,106 @@ ADMIN_USERNAMES = ["gelomipt", "tg_anton"]
 
 if not all([DB_USER, DB_PASSWORD, DB_NAME]):
     raise ValueError("Database credentials are not fully set in environment variables")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))
+
+# Upper bound on database calls running at once off the event loop
+DB_MAX_CONCURRENCY = int(os.getenv('DB_MAX_CONCURRENCY', str(DB_POOL_SIZE)))
+
+# Read replicas for read-only queries: comma-separated host or host:port
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_REPLICA_POOL_SIZE = int(os.getenv('DB_REPLICA_POOL_SIZE', str(DB_POOL_SIZE)))
+DB_REPLICA_ACQUIRE_TIMEOUT = float(os.getenv('DB_REPLICA_ACQUIRE_TIMEOUT', '0.5'))  # then fall back to the primary
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))  # seconds behind the primary before a replica is skipped
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '5'))
+# After a user's write, their reads stay on the primary this long (read-your-writes)
+DB_STICKY_SECONDS = float(os.getenv('DB_STICKY_SECONDS', str(DB_REPLICA_MAX_LAG + 1)))
+
+# Player identity cache (keyed by Telegram user id)
+PLAYER_CACHE_SIZE = int(os.getenv('PLAYER_CACHE_SIZE', '1024'))
+PLAYER_CACHE_TTL = float(os.getenv('PLAYER_CACHE_TTL', '300'))
+# Updates processed at once (different users in parallel, each user's in order); 1 = sequential
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '32'))
+# Updates one user may have waiting behind their running one; further updates are dropped
+MAX_QUEUED_UPDATES_PER_USER = int(os.getenv('MAX_QUEUED_UPDATES_PER_USER', '20'))
+# Per-player "my games" lists, dropped on every registration change
+MY_GAMES_CACHE_SIZE = int(os.getenv('MY_GAMES_CACHE_SIZE', '1024'))
+MY_GAMES_CACHE_TTL = float(os.getenv('MY_GAMES_CACHE_TTL', '300'))
+
+# Outgoing notification limits (Telegram allows ~30 messages/s overall and ~1 message/s per chat)
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '25'))
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv('NOTIFY_PER_CHAT_INTERVAL', '1.1'))
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '5'))
+NOTIFY_DEDUP_WINDOW = float(os.getenv('NOTIFY_DEDUP_WINDOW', '300'))
+NOTIFY_MAX_IN_FLIGHT = int(os.getenv('NOTIFY_MAX_IN_FLIGHT', '8'))
+
+# Number of rows per page in admin player/game pickers
+PICKER_PAGE_SIZE = int(os.getenv('PICKER_PAGE_SIZE', '10'))
+
+# Seconds a pending free-text step stays valid before the user has to start over
+TEXT_INPUT_TIMEOUT = float(os.getenv('TEXT_INPUT_TIMEOUT', '600'))
+# Admins typing one new value (add player, edit a player or game attribute)
+TEXT_INPUT_EDIT_TIMEOUT = float(os.getenv('TEXT_INPUT_EDIT_TIMEOUT', '120'))
+# New players filling in their registration details
+TEXT_INPUT_REGISTRATION_TIMEOUT = float(os.getenv('TEXT_INPUT_REGISTRATION_TIMEOUT', '900'))
+
+# Update delivery: 'polling' (default) or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # public HTTPS URL Telegram posts to, e.g. https://bot.example.com/telegram
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Override the Bot API endpoint, e.g. to point the bot at fake_telegram.py
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+
+# Scale-out: N workers behind ingress.py, each started with WORKER_INDEX=0..N-1
+WORKER_INDEX = os.getenv('WORKER_INDEX')
+WORKER_INDEX = int(WORKER_INDEX) if WORKER_INDEX is not None else None
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', '8450'))  # worker i listens on 127.0.0.1:WORKER_BASE_PORT + i
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+# Where workers share conversation state and cache invalidations: 'local' (single process) or 'mysql'
+SHARED_STORE = os.getenv('SHARED_STORE', 'local')
+SHARED_STORE_POLL_INTERVAL = float(os.getenv('SHARED_STORE_POLL_INTERVAL', '0.5'))
+
+if BOT_MODE not in ('polling', 'webhook'):
+    raise ValueError("BOT_MODE must be 'polling' or 'webhook'")
+if BOT_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET):
+    raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode")
+if SHARED_STORE not in ('local', 'mysql'):
+    raise ValueError("SHARED_STORE must be 'local' or 'mysql'")
+if WORKER_INDEX is not None and (BOT_MODE != 'webhook' or SHARED_STORE != 'mysql'):
+    raise ValueError("Workers need BOT_MODE=webhook and SHARED_STORE=mysql")
+
+# Key for signing callback_data; defaults to the bot token so buttons survive restarts
+CALLBACK_SECRET = os.getenv('CALLBACK_SECRET') or TOKEN
+# Repeated taps on the same button (and Telegram's redeliveries) within this many seconds are dropped
+CALLBACK_DEDUP_WINDOW = float(os.getenv('CALLBACK_DEDUP_WINDOW', '3'))
+
+# Durable user_data / conversation state
+PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', 'padelbot_state.sqlite3')
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '10'))
+
+# Prometheus-style metrics endpoint, off by default; worker i of a scaled-out deployment uses METRICS_PORT + i
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Bulk player import from an uploaded CSV
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Admin CSV exports: rows fetched per round trip from the unbuffered cursor
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+# Admin broadcasts: sends per second (kept under NOTIFY_GLOBAL_RATE so player notifications still get through),
+# recipients read per query, and how many broadcast messages may wait in the notification queue at once
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '15'))
+BROADCAST_CHUNK_SIZE = int(os.getenv('BROADCAST_CHUNK_SIZE', '200'))
+BROADCAST_MAX_BACKLOG = int(os.getenv('BROADCAST_MAX_BACKLOG', '50'))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', '10'))
+# A running broadcast with no progress saved for this long is taken over by another worker
+BROADCAST_STALE_AFTER = float(os.getenv('BROADCAST_STALE_AFTER', '60'))
@@ -0,0 +1,96 @@
+# dashboard.py
+
+import time
+from collections import OrderedDict
+
+from config import MY_GAMES_CACHE_SIZE, MY_GAMES_CACHE_TTL
+from database import fetch_all
+from schedule_cache import schedule_snapshot
+from shared_store import on_invalidation, publish_invalidation
+from utils import format_timedelta
+
+
+class MyGamesCache:
+    """Bounded LRU cache of each player's upcoming registrations, keyed by player id.
+
+    Entries carry the schedule snapshot generation they were loaded under, so
+    any admin change to the schedule makes every entry stale at once.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # player_id -> (registrations, generation, expires_at)
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, player_id):
+        entry = self._entries.get(player_id)
+        if entry is None or entry[1] != schedule_snapshot.generation or entry[2] < time.monotonic():
+            self._entries.pop(player_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(player_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, player_id, registrations, generation, invalidations):
+        if invalidations != self.invalidations:
+            # Something changed while the list was loading; let the next read reload it
+            return
+        self._entries[player_id] = (registrations, generation, time.monotonic() + self.ttl)
+        self._entries.move_to_end(player_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, player_id):
+        self.invalidations += 1
+        self._entries.pop(player_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+my_games_cache = MyGamesCache(MY_GAMES_CACHE_SIZE, MY_GAMES_CACHE_TTL)
+
+
+async def _load_my_games(player_id):
+    # One indexed lookup on registrations(player_id, ...) joined to the schedule by primary key
+    rows = await fetch_all("""
+        SELECT r.id, r.game_id, r.confirmed, r.waiting, r.swap_requested,
+               s.event_date, s.start_time, s.venue
+        FROM registrations r
+        JOIN schedule s ON s.id = r.game_id
+        WHERE r.player_id = %s AND s.finished IS NULL AND s.event_date >= CURDATE()
+        ORDER BY s.event_date, s.start_time, s.id
+    """, (player_id,), dictionary=True, readonly=True)
+    return [{
+        'id': row['id'],
+        'game_id': row['game_id'],
+        'confirmed': bool(row['confirmed']),
+        'waiting': bool(row['waiting']),
+        'swap_requested': bool(row['swap_requested']),
+        'label': f"{row['event_date']} at {format_timedelta(row['start_time'])} - {row['venue']}",
+    } for row in rows]
+
+
+async def get_my_games(player_id):
+    """Return the player's registrations for upcoming, unfinished games, oldest first."""
+    registrations = my_games_cache.get(player_id)
+    if registrations is None:
+        generation, invalidations = schedule_snapshot.generation, my_games_cache.invalidations
+        registrations = await _load_my_games(player_id)
+        my_games_cache.put(player_id, registrations, generation, invalidations)
+    return registrations
+
+
+def invalidate_my_games(player_id):
+    """Forget a player's cached list after any change to their registrations."""
+    my_games_cache.invalidate(player_id)
+    publish_invalidation('my_games', player_id=player_id)
+
+
+@on_invalidation('my_games')
+def _invalidated_elsewhere(message):
+    my_games_cache.invalidate(message['player_id'])
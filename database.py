@@ -1,21 +1,453 @@
 import mysql.connector
-import os
-from config import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from metrics import observe_query
+from config import (
+    DB_USER,
+    DB_PASSWORD,
+    DB_HOST,
+    DB_NAME,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_PING_AFTER,
+    DB_MAX_CONCURRENCY,
+    DB_REPLICA_HOSTS,
+    DB_REPLICA_POOL_SIZE,
+    DB_REPLICA_ACQUIRE_TIMEOUT,
+    DB_REPLICA_MAX_LAG,
+    DB_REPLICA_LAG_CHECK_INTERVAL,
+    DB_STICKY_SECONDS,
+)
 
+logger = logging.getLogger(__name__)
 
 DB_CONFIG = {
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'database': os.getenv('DB_NAME', 'Padel'),
+    'user': DB_USER,
+    'password': DB_PASSWORD,
+    'host': DB_HOST,
+    'database': DB_NAME,
 }
 # MySQL Database connection configuration
 if not all([DB_USER, DB_PASSWORD, DB_NAME]):
     raise EnvironmentError("Database configuration incomplete in environment variables")
-    
-def connect_db():
-    """Create a connection to the MySQL database."""
-    return mysql.connector.connect(**DB_CONFIG)
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class TimedCursor:
+    """Wraps a driver cursor so every statement is recorded in the query latency metrics."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            observe_query(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            observe_query(operation, time.perf_counter() - started)
+
+
+class PooledConnection:
+    """Wraps a MySQL connection so that close() hands it back to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.InterfaceError("Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise mysql.connector.InterfaceError("Connection already returned to the pool")
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+    def commit(self):
+        if self._conn is None:
+            raise mysql.connector.InterfaceError("Connection already returned to the pool")
+        self._conn.commit()
+        if not self._pool.readonly:
+            note_write()
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    Idle connections older than ``idle_timeout`` are closed, and connections
+    that sat idle longer than ``ping_after`` are pinged before being handed out.
+    """
+
+    def __init__(self, size, timeout, idle_timeout, ping_after, readonly=False, **db_config):
+        self.size = size
+        self.readonly = readonly
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.db_config = db_config
+        self._idle = deque()  # (connection, last_used) pairs, most recent on the right
+        self._open = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            'created': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'evicted': 0,
+            'health_failures': 0,
+        }
+
+    def _evict_idle(self, now):
+        # Oldest connections sit on the left of the deque
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+            self._counters['evicted'] += 1
+
+    def _discard(self, conn):
+        self._open -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_for):
+        if idle_for < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._open < self.size:
+                    self._open += 1
+                    conn, last_used = None, None
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolExhaustedError(f"No database connection available after {self.timeout}s")
+                    self._counters['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                # Open new connections outside the lock so the handshake does not block other callers
+                try:
+                    conn = mysql.connector.connect(**self.db_config)
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters['created'] += 1
+                    self._counters['checkouts'] += 1
+                return PooledConnection(self, conn)
+
+            if self._is_healthy(conn, time.monotonic() - last_used):
+                with self._cond:
+                    self._counters['checkouts'] += 1
+                return PooledConnection(self, conn)
+
+            with self._cond:
+                self._counters['health_failures'] += 1
+                self._discard(conn)
+
+    def release(self, conn):
+        healthy = True
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            healthy = False
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update({
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+            })
+        return stats
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+
+pool = ConnectionPool(
+    size=DB_POOL_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    ping_after=DB_POOL_PING_AFTER,
+    **DB_CONFIG,
+)
+
+
+class ReplicaSet:
+    """Pools for the read replicas, with replication lag checked per replica.
+
+    A replica is used only while it is reachable and at most ``max_lag`` seconds
+    behind the primary; lag is re-read at most every ``check_interval`` seconds.
+    """
+
+    def __init__(self, pools, max_lag, check_interval):
+        self.pools = pools
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag = {}  # pool index -> (seconds behind or None if unusable, checked_at)
+        self._next = 0
+        self._lock = threading.Lock()
+        self._counters = {'reads': 0, 'fallbacks': 0}
+
+    def _measure_lag(self, pool):
+        conn = pool.acquire()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.Error:
+                # Servers before MySQL 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return float(lag) if lag is not None else None  # NULL while replication is stopped
+
+    def _usable(self, index):
+        now = time.monotonic()
+        with self._lock:
+            lag, checked_at = self._lag.get(index, (None, None))
+        if checked_at is None or now - checked_at > self.check_interval:
+            try:
+                lag = self._measure_lag(self.pools[index])
+            except Exception as e:
+                logger.warning(f"Replica {index} lag check failed: {e}")
+                lag = None
+            with self._lock:
+                self._lag[index] = (lag, now)
+        return lag is not None and lag <= self.max_lag
+
+    def acquire(self):
+        """Return a connection from a usable replica, round robin, or None to use the primary."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            if not self._usable(index):
+                continue
+            try:
+                conn = self.pools[index].acquire()
+            except (PoolExhaustedError, mysql.connector.Error):
+                continue
+            with self._lock:
+                self._counters['reads'] += 1
+            return conn
+        with self._lock:
+            self._counters['fallbacks'] += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = {f"replica_{key}": value for key, value in self._counters.items()}
+            for index, (lag, _) in self._lag.items():
+                stats[f"replica{index}_lag"] = -1 if lag is None else lag
+        for index, replica_pool in enumerate(self.pools):
+            stats[f"replica{index}_in_use"] = replica_pool.stats()['in_use']
+        return stats
+
+
+def _replica_config(host):
+    config = dict(DB_CONFIG)
+    host, _, port = host.partition(':')
+    config['host'] = host
+    if port:
+        config['port'] = int(port)
+    return config
+
+
+replicas = ReplicaSet(
+    [
+        ConnectionPool(
+            size=DB_REPLICA_POOL_SIZE,
+            timeout=DB_REPLICA_ACQUIRE_TIMEOUT,
+            idle_timeout=DB_POOL_IDLE_TIMEOUT,
+            ping_after=DB_POOL_PING_AFTER,
+            readonly=True,
+            **_replica_config(host),
+        )
+        for host in DB_REPLICA_HOSTS
+    ],
+    max_lag=DB_REPLICA_MAX_LAG,
+    check_interval=DB_REPLICA_LAG_CHECK_INTERVAL,
+) if DB_REPLICA_HOSTS else None
+
+# Read-your-writes: the session (Telegram user) of the current update, and when
+# each session's recent writes are safe to read from a replica
+_session = contextvars.ContextVar('db_session', default=None)
+_sticky_until = {}
+_sticky_lock = threading.Lock()
+
+
+def set_session(key):
+    """Attribute the database work of the current update to a session, e.g. a Telegram user id."""
+    _session.set(key)
+
+
+def note_write(key=None):
+    """Keep a session's reads on the primary until its writes have reached the replicas."""
+    key = _session.get() if key is None else key
+    if key is None or replicas is None:
+        return
+    now = time.monotonic()
+    with _sticky_lock:
+        _sticky_until[key] = now + DB_STICKY_SECONDS
+        if len(_sticky_until) > 10000:
+            for stale in [k for k, until in _sticky_until.items() if until < now]:
+                del _sticky_until[stale]
+
+
+def _is_sticky():
+    key = _session.get()
+    if key is None:
+        return False
+    with _sticky_lock:
+        until = _sticky_until.get(key)
+    return until is not None and until > time.monotonic()
+
+
+def connect_db(readonly=False):
+    """Check out a connection; close() returns it.
+
+    Writes, transactions and anything that must see the latest data use the
+    primary. With readonly=True the connection comes from a replica when one is
+    configured, fresh enough, and the session has not written recently.
+    """
+    if readonly and replicas is not None and not _is_sticky():
+        conn = replicas.acquire()
+        if conn is not None:
+            return conn
+    return pool.acquire()
+
+
+def get_pool_stats():
+    """Return a snapshot of connection pool counters for monitoring."""
+    stats = pool.stats()
+    if replicas is not None:
+        stats.update(replicas.stats())
+    return stats
+
+# Blocking driver calls run on a bounded thread pool so the event loop keeps serving other chats
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_CONCURRENCY, thread_name_prefix='db')
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database function on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context into the worker thread so queries count towards the current update
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+def _fetch(query, params, dictionary, one, readonly):
+    conn = connect_db(readonly)
+    try:
+        cursor = conn.cursor(dictionary=dictionary)
+        cursor.execute(query, params)
+        result = cursor.fetchone() if one else cursor.fetchall()
+        cursor.close()
+        return result
+    finally:
+        conn.close()
+
+
+def _execute(query, params):
+    conn = connect_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        conn.commit()
+        rowcount = cursor.rowcount
+        cursor.close()
+        return rowcount
+    finally:
+        conn.close()
+
+
+async def fetch_all(query, params=(), dictionary=False, readonly=False):
+    """Run a SELECT off the event loop and return all rows. readonly=True allows a replica."""
+    return await run_db(_fetch, query, params, dictionary, False, readonly)
+
+
+async def fetch_one(query, params=(), dictionary=False, readonly=False):
+    """Run a SELECT off the event loop and return the first row (or None). readonly=True allows a replica."""
+    return await run_db(_fetch, query, params, dictionary, True, readonly)
+
+
+async def execute(query, params=()):
+    """Run a single write statement off the event loop, commit, and return the row count."""
+    return await run_db(_execute, query, params)
 
 # Database functions
 def get_player_by_nickname(nickname):
@@ -27,4 +459,273 @@ def get_player_by_nickname(nickname):
     conn.close()
     return player
 
-# Other database functions...
\ No newline at end of file
+# Other database functions...
+
+def add_registration(player_id, game_id):
+    """Register a player for a game, putting them on the waiting list if the game is full.
+
+    The game row is locked for the duration of the transaction, so concurrent
+    registrations for the same game are serialized and cannot overfill it.
+    The insert leans on the (player_id, game_id) unique key, so a repeat never
+    adds a row or bumps a counter even if it slips past the EXISTS check.
+    Returns 'registered', 'waiting', 'duplicate' or 'not_found'.
+    """
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cursor.execute("""
+            SELECT s.capacity, s.main_count,
+                   EXISTS(SELECT 1 FROM registrations r WHERE r.game_id = s.id AND r.player_id = %s) AS already_registered
+            FROM schedule s
+            WHERE s.id = %s
+            FOR UPDATE
+        """, (player_id, game_id))
+        game = cursor.fetchone()
+        if not game:
+            conn.rollback()
+            return 'not_found'
+        if game['already_registered']:
+            conn.rollback()
+            return 'duplicate'
+
+        waiting = game['main_count'] >= game['capacity']
+        cursor.execute("""
+            INSERT INTO registrations (player_id, game_id, confirmed, waiting) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+        """, (player_id, game_id, False, waiting))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return 'duplicate'
+        if waiting:
+            cursor.execute("UPDATE schedule SET waiting_count = waiting_count + 1 WHERE id = %s", (game_id,))
+        else:
+            cursor.execute("UPDATE schedule SET main_count = main_count + 1 WHERE id = %s", (game_id,))
+        conn.commit()
+        return 'waiting' if waiting else 'registered'
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def confirm_registration(reg_id, player_id):
+    """Mark a player's registration as confirmed. Returns True if it was unconfirmed before."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute("""
+            UPDATE registrations r
+            JOIN schedule s ON s.id = r.game_id
+            SET r.confirmed = TRUE, s.confirmed_count = s.confirmed_count + 1
+            WHERE r.id = %s AND r.player_id = %s AND r.confirmed = FALSE
+        """, (reg_id, player_id))
+        changed = cursor.rowcount > 0
+        conn.commit()
+        return changed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def cancel_registration(reg_id, player_id):
+    """Delete a player's registration and promote the first waiting player if a main-list spot opened.
+
+    Returns None when the registration does not exist, otherwise the promoted
+    player's row (id, telegram_id, nickname) or {} when nobody was promoted.
+    """
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cursor.execute("SELECT game_id FROM registrations WHERE id = %s AND player_id = %s", (reg_id, player_id))
+        registration = cursor.fetchone()
+        if not registration:
+            conn.rollback()
+            return None
+        game_id = registration['game_id']
+
+        # Lock the game row first, in the same order as add_registration, then re-read the registration
+        cursor.execute("SELECT id FROM schedule WHERE id = %s FOR UPDATE", (game_id,))
+        cursor.execute("SELECT confirmed, waiting FROM registrations WHERE id = %s AND player_id = %s FOR UPDATE", (reg_id, player_id))
+        registration = cursor.fetchone()
+        if not registration:
+            conn.rollback()
+            return None
+
+        cursor.execute("DELETE FROM registrations WHERE id = %s", (reg_id,))
+        cursor.execute("""
+            UPDATE schedule
+            SET main_count = main_count - %s, waiting_count = waiting_count - %s, confirmed_count = confirmed_count - %s
+            WHERE id = %s
+        """, (0 if registration['waiting'] else 1, 1 if registration['waiting'] else 0,
+              1 if registration['confirmed'] else 0, game_id))
+
+        promoted = {}
+        if not registration['waiting']:
+            cursor.execute("""
+                SELECT r.id, p.id AS player_id, p.telegram_id, p.nickname FROM registrations r
+                JOIN players p ON p.id = r.player_id
+                WHERE r.game_id = %s AND r.waiting = TRUE
+                ORDER BY r.id ASC LIMIT 1
+            """, (game_id,))
+            waiting_player = cursor.fetchone()
+            if waiting_player:
+                cursor.execute("UPDATE registrations SET waiting = FALSE WHERE id = %s", (waiting_player['id'],))
+                cursor.execute("""
+                    UPDATE schedule SET main_count = main_count + 1, waiting_count = waiting_count - 1
+                    WHERE id = %s
+                """, (game_id,))
+                promoted = {
+                    'id': waiting_player['player_id'],
+                    'telegram_id': waiting_player['telegram_id'],
+                    'nickname': waiting_player['nickname'],
+                }
+        conn.commit()
+        if promoted.get('telegram_id'):
+            # The promoted player should see their new place on their next read too
+            note_write(promoted['telegram_id'])
+        return promoted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def delete_game(game_id):
+    """Delete a game together with its registrations in one transaction."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM registrations WHERE game_id = %s", (game_id,))
+        cursor.execute("DELETE FROM schedule WHERE id = %s", (game_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def insert_games(games):
+    """Insert (event_date, start_time, end_time, venue, capacity) rows in one transaction.
+
+    Games already scheduled for the same date, start time and venue are skipped
+    (the no-op update leaves them untouched and counts 0 rows). Returns the number of games actually created.
+    """
+    if not games:
+        return 0
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO schedule (event_date, start_time, end_time, venue, capacity)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+        """, games)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def upsert_players(players, batch_size):
+    """Insert or update (name, nickname, level) rows keyed on nickname, in one transaction.
+
+    Rows go in multi-row INSERT ... ON DUPLICATE KEY UPDATE statements of
+    ``batch_size`` rows. Returns (inserted, updated); unchanged rows count as neither.
+    """
+    if not players:
+        return 0, 0
+    conn = connect_db()
+    cursor = conn.cursor()
+    inserted = updated = 0
+    try:
+        for start in range(0, len(players), batch_size):
+            batch = players[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f"SELECT COUNT(*) FROM players WHERE nickname IN ({placeholders})",
+                [nickname for _, nickname, _ in batch]
+            )
+            existing = cursor.fetchone()[0]
+            cursor.execute(
+                f"""INSERT INTO players (name, nickname, level)
+                    VALUES {', '.join(['(%s, %s, %s)'] * len(batch))}
+                    ON DUPLICATE KEY UPDATE name = VALUES(name), level = VALUES(level)""",
+                [value for row in batch for value in row]
+            )
+            # MySQL counts 1 per inserted row and 2 per updated row
+            batch_inserted = len(batch) - existing
+            inserted += batch_inserted
+            updated += (cursor.rowcount - batch_inserted) // 2
+        conn.commit()
+        return inserted, updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def delete_player(player_id):
+    """Delete a player together with their registrations in one transaction."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        # Take the player's registrations off the occupancy counters of every affected game
+        cursor.execute("""
+            UPDATE schedule s
+            JOIN (
+                SELECT game_id,
+                       SUM(waiting = FALSE) AS main_count,
+                       SUM(confirmed = TRUE) AS confirmed_count,
+                       SUM(waiting = TRUE) AS waiting_count
+                FROM registrations
+                WHERE player_id = %s
+                GROUP BY game_id
+            ) r ON r.game_id = s.id
+            SET s.main_count = s.main_count - r.main_count,
+                s.confirmed_count = s.confirmed_count - r.confirmed_count,
+                s.waiting_count = s.waiting_count - r.waiting_count
+        """, (player_id,))
+        cursor.execute("DELETE FROM registrations WHERE player_id = %s", (player_id,))
+        cursor.execute("DELETE FROM players WHERE id = %s", (player_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def recount_occupancy():
+    """Recompute every game's occupancy counters from the registrations table. Returns the rows updated."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE schedule s
+            LEFT JOIN (
+                SELECT game_id,
+                       SUM(waiting = FALSE) AS main_count,
+                       SUM(confirmed = TRUE) AS confirmed_count,
+                       SUM(waiting = TRUE) AS waiting_count
+                FROM registrations
+                GROUP BY game_id
+            ) r ON r.game_id = s.id
+            SET s.main_count = COALESCE(r.main_count, 0),
+                s.confirmed_count = COALESCE(r.confirmed_count, 0),
+                s.waiting_count = COALESCE(r.waiting_count, 0)
+        """)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
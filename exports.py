@@ -0,0 +1,90 @@
+# exports.py
+
+import csv
+import datetime
+import gzip
+import io
+import tempfile
+
+from config import EXPORT_CHUNK_SIZE
+from database import connect_db
+from utils import format_timedelta
+
+# name -> (header, query)
+EXPORTS = {
+    'games': (
+        ['game_id', 'event_date', 'start_time', 'end_time', 'venue', 'capacity',
+         'main_count', 'confirmed_count', 'waiting_count', 'finished'],
+        """SELECT id, event_date, start_time, end_time, venue, capacity,
+                  main_count, confirmed_count, waiting_count, finished
+           FROM schedule
+           ORDER BY event_date, start_time, id""",
+    ),
+    'rosters': (
+        ['game_id', 'event_date', 'start_time', 'venue', 'nickname', 'name', 'level', 'confirmed', 'waiting'],
+        """SELECT s.id, s.event_date, s.start_time, s.venue, p.nickname, p.name, p.level, r.confirmed, r.waiting
+           FROM schedule s
+           JOIN registrations r ON r.game_id = s.id
+           JOIN players p ON p.id = r.player_id
+           WHERE s.finished IS NULL
+           ORDER BY s.event_date, s.start_time, s.id, r.waiting, r.id""",
+    ),
+    'registrations': (
+        ['registration_id', 'game_id', 'event_date', 'start_time', 'venue', 'player_id', 'nickname',
+         'confirmed', 'waiting', 'swap_requested', 'game_finished'],
+        """SELECT r.id, s.id, s.event_date, s.start_time, s.venue, p.id, p.nickname,
+                  r.confirmed, r.waiting, r.swap_requested, s.finished
+           FROM registrations r
+           JOIN schedule s ON s.id = r.game_id
+           JOIN players p ON p.id = r.player_id
+           ORDER BY r.id""",
+    ),
+}
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.timedelta):
+        return format_timedelta(value)
+    return value
+
+
+def write_export(name, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write one export as CSV (gzip-compressed if asked) to a temporary file. Blocking; run it via run_db.
+
+    Rows are pulled from an unbuffered cursor ``chunk_size`` at a time and written
+    straight to disk, so memory use does not grow with the table. Returns
+    (file object rewound to the start, row count); the caller closes the file.
+    """
+    header, query = EXPORTS[name]
+    output = tempfile.TemporaryFile()
+    raw = gzip.GzipFile(fileobj=output, mode='wb') if compress else output
+    text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(header)
+
+    rows = 0
+    conn = connect_db(readonly=True)
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            writer.writerows([_cell(value) for value in row] for row in chunk)
+            rows += len(chunk)
+    except Exception:
+        output.close()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Detaching flushes the text layer; closing the gzip stream writes its trailer but leaves the temp file open
+    text.detach()
+    if compress:
+        raw.close()
+    output.seek(0)
+    return output, rows
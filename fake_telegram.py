@@ -0,0 +1,223 @@
+# fake_telegram.py
+#
+# Offline stand-in for the Telegram Bot API, for exercising webhook mode locally.
+#
+# 1. Start the fake API and point it at the bot's webhook:
+#        python fake_telegram.py --port 8081 --webhook http://127.0.0.1:8443/telegram --secret s3cret
+# 2. Start the bot against it:
+#        BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8443/telegram WEBHOOK_SECRET=s3cret \
+#        TELEGRAM_API_URL=http://127.0.0.1:8081/bot python bot.py
+# 3. Type lines into the fake API's console; each one is delivered to the bot as a
+#    text message (or as a button tap when prefixed with "tap ").
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'PadelBot', 'username': 'padel_test_bot'}
+
+
+class FakeBotApi:
+    """Answers Bot API methods with canned but well-formed results and records every call."""
+
+    def __init__(self):
+        self.calls = []
+        self.webhook_url = None
+        self._message_ids = itertools.count(1)
+
+    def _message(self, params):
+        chat_id = params.get('chat_id', 0)
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id if isinstance(chat_id, int) else 0, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    def handle(self, method, params):
+        """Return the 'result' payload for a Bot API call."""
+        self.calls.append((method, params))
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = None
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url or '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method == 'getUpdates':
+            return []
+        if method in ('sendMessage', 'editMessageText', 'sendDocument'):
+            return self._message(params)
+        return True
+
+    def count(self, method):
+        return sum(1 for name, _ in self.calls if name == method)
+
+
+def parse_params(body, content_type):
+    """Decode a Bot API request body; values PTB sends form-encoded are JSON-encoded themselves."""
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    params = {}
+    for key, value in parse_qsl(body.decode('utf-8'), keep_blank_values=True):
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+class FakeTelegramServer:
+    """Minimal HTTP/1.1 server exposing FakeBotApi at /bot<token>/<method>."""
+
+    def __init__(self, api, host='127.0.0.1', port=8081):
+        self.api = api
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 picks a free port; report the one actually bound
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                method = path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+                params = parse_params(body, headers.get('content-type', ''))
+                payload = json.dumps({'ok': True, 'result': self.api.handle(method, params)}).encode('utf-8')
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode('latin-1')
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+_update_ids = itertools.count(1)
+
+
+def make_user(user_id, username):
+    return {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username}
+
+
+def make_message_update(user_id, username, text):
+    """Build an Update dict carrying a private text message from the given user."""
+    message = {
+        'message_id': next(_update_ids),
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': make_user(user_id, username),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': next(_update_ids), 'message': message}
+
+
+def make_callback_update(user_id, username, data):
+    """Build an Update dict for a tap on an inline button carrying callback_data."""
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': make_user(user_id, username),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': '',
+            },
+        },
+    }
+
+
+async def post_update(client, webhook_url, secret, update):
+    """Deliver an update to the bot's webhook the way Telegram does. Returns the HTTP status."""
+    response = await client.post(
+        webhook_url,
+        json=update,
+        headers={'X-Telegram-Bot-Api-Secret-Token': secret},
+    )
+    return response.status_code
+
+
+async def _console(args):
+    api = FakeBotApi()
+    server = FakeTelegramServer(api, args.host, args.port)
+    await server.start()
+    print(f"Fake Bot API listening on http://{args.host}:{args.port}/bot<token>/<method>")
+    print("Type a message to send it to the bot, 'tap <callback_data>' to press a button, 'calls' to list API calls.")
+
+    loop = asyncio.get_running_loop()
+    async with httpx.AsyncClient() as client:
+        while True:
+            line = await loop.run_in_executor(None, input, '> ')
+            line = line.strip()
+            if not line:
+                continue
+            if line == 'calls':
+                for method, params in api.calls:
+                    print(method, params)
+                continue
+            if line.startswith('tap '):
+                update = make_callback_update(args.user_id, args.username, line[4:])
+            else:
+                update = make_message_update(args.user_id, args.username, line)
+            status = await post_update(client, args.webhook, args.secret, update)
+            print(f"webhook answered {status}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API for offline webhook testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--webhook', default='http://127.0.0.1:8443/telegram')
+    parser.add_argument('--secret', required=True)
+    parser.add_argument('--user-id', type=int, default=4242)
+    parser.add_argument('--username', default='test_player')
+    try:
+        asyncio.run(_console(parser.parse_args()))
+    except (KeyboardInterrupt, EOFError):
+        pass
@@ -0,0 +1,60 @@
+# game_templates.py
+
+import datetime
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+MAX_WEEKS = 52
+
+USAGE = (
+    "Usage: /recurring_games <days> <start>-<end> <weeks> <capacity> <venue>\n"
+    "Example: /recurring_games Tue,Thu 19:00-21:00 12 8 Padel Club Court 2"
+)
+
+
+def parse_template(args):
+    """Parse the /recurring_games arguments into a template dict. Raises ValueError with a user-facing message."""
+    if len(args) < 5:
+        raise ValueError(USAGE)
+    days_text, times_text, weeks_text, capacity_text = args[:4]
+    venue = ' '.join(args[4:])
+
+    weekdays = set()
+    for day in days_text.lower().split(','):
+        if day[:3] not in WEEKDAYS:
+            raise ValueError(f"Unknown day {day!r}. Use Mon, Tue, Wed, Thu, Fri, Sat or Sun.")
+        weekdays.add(WEEKDAYS.index(day[:3]))
+
+    start_text, _, end_text = times_text.partition('-')
+    try:
+        start_time = datetime.datetime.strptime(start_text, '%H:%M').time()
+        end_time = datetime.datetime.strptime(end_text, '%H:%M').time()
+    except ValueError:
+        raise ValueError("Invalid time range. Use HH:MM-HH:MM in 24-hour format.")
+    if end_time <= start_time:
+        raise ValueError("The end time must be after the start time.")
+
+    if not weeks_text.isdigit() or not 1 <= int(weeks_text) <= MAX_WEEKS:
+        raise ValueError(f"Weeks must be a number from 1 to {MAX_WEEKS}.")
+    if not capacity_text.isdigit() or int(capacity_text) < 1:
+        raise ValueError("Capacity must be a positive number.")
+
+    return {
+        'weekdays': sorted(weekdays),
+        'start_time': start_time.strftime('%H:%M'),
+        'end_time': end_time.strftime('%H:%M'),
+        'weeks': int(weeks_text),
+        'capacity': int(capacity_text),
+        'venue': venue,
+    }
+
+
+def occurrences(template, first_day):
+    """Return schedule rows (event_date, start_time, end_time, venue, capacity) for every
+    matching weekday in the ``weeks`` weeks starting at ``first_day``."""
+    rows = []
+    for offset in range(template['weeks'] * 7):
+        day = first_day + datetime.timedelta(days=offset)
+        if day.weekday() in template['weekdays']:
+            rows.append((day.isoformat(), template['start_time'], template['end_time'],
+                         template['venue'], template['capacity']))
+    return rows
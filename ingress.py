@@ -0,0 +1,187 @@
+# ingress.py
+#
+# Webhook front end for running several bot workers. Telegram posts every update
+# here (WEBHOOK_URL must point at this process); each update is forwarded to the
+# worker that owns its user, worker = user id % N, so one user's updates always
+# reach the same worker in order while different users spread across cores.
+#
+#     BOT_MODE=webhook SHARED_STORE=mysql python ingress.py --workers 4 --spawn
+#
+# --spawn starts the workers too (WORKER_INDEX=0..N-1 python bot.py); without it
+# they are expected to be running already on WORKER_BASE_PORT + index.
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import subprocess
+import sys
+from http import HTTPStatus
+
+import httpx
+
+from config import WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WORKER_BASE_PORT
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+# Telegram updates are a few KB; anything far larger is not from Telegram
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+
+
+def partition_key(update):
+    """Telegram user id an update belongs to, falling back to its chat id; None if it has neither."""
+    for field, value in update.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        for holder in (value, value.get('message') or {}):
+            user = holder.get('from') or holder.get('user')
+            if user and 'id' in user:
+                return user['id']
+        for holder in (value, value.get('message') or {}):
+            chat = holder.get('chat')
+            if chat and 'id' in chat:
+                return chat['id']
+    return None
+
+
+def worker_urls(count, base_port=WORKER_BASE_PORT, path=WEBHOOK_PATH):
+    """Webhook URL of each worker; worker i is bot.py with WORKER_INDEX=i, listening on base_port + i."""
+    return [f"http://127.0.0.1:{base_port + index}/{path.strip('/')}" for index in range(count)]
+
+
+class Ingress:
+    """Minimal HTTP/1.1 server that checks Telegram's secret token and forwards updates to their worker."""
+
+    def __init__(self, worker_urls, secret, path, client=None):
+        self.worker_urls = worker_urls
+        self.secret = secret
+        self.path = '/' + path.strip('/')
+        self.forwarded = [0] * len(worker_urls)
+        self._client = client or httpx.AsyncClient(timeout=10)
+
+    def worker_for(self, update):
+        key = partition_key(update)
+        return (key or 0) % len(self.worker_urls)
+
+    async def forward(self, body):
+        """Forward one update body; returns the HTTP status to answer Telegram with."""
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400
+        index = self.worker_for(update)
+        try:
+            response = await self._client.post(
+                self.worker_urls[index],
+                content=body,
+                headers={'Content-Type': 'application/json', SECRET_HEADER: self.secret},
+            )
+        except httpx.HTTPError as e:
+            # Telegram redelivers on a non-2xx answer, so a restarting worker loses nothing
+            logger.warning(f"Worker {index} unreachable: {e}")
+            return 502
+        self.forwarded[index] += 1
+        return response.status_code
+
+    def _authorized(self, headers):
+        token = headers.get(SECRET_HEADER, '').encode('latin-1')
+        return bool(self.secret) and hmac.compare_digest(token, self.secret.encode('latin-1'))
+
+    async def _respond(self, writer, status, close=False):
+        extra = "Connection: close\r\n" if close else ""
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Length: 0\r\n{extra}\r\n".encode('latin-1'))
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    if len(headers) >= MAX_HEADERS:
+                        await self._respond(writer, 431, close=True)
+                        return
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                # Reject before reading the body, so an unauthenticated client cannot make us buffer it
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if method != 'POST' or path.split('?', 1)[0].rstrip('/') != self.path:
+                    status = 404
+                elif not self._authorized(headers):
+                    status = 403
+                elif length < 0:
+                    status = 400
+                elif length > MAX_BODY_BYTES:
+                    status = 413
+                else:
+                    status = await self.forward(await reader.readexactly(length))
+                    await self._respond(writer, status)
+                    continue
+                # The unread body makes the connection unusable for another request
+                await self._respond(writer, status, close=True)
+                return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def spawn_workers(count):
+    workers = []
+    for index in range(count):
+        env = dict(os.environ, WORKER_INDEX=str(index))
+        workers.append(subprocess.Popen([sys.executable, 'bot.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__))))
+    return workers
+
+
+async def serve(args):
+    ingress = Ingress(worker_urls(args.workers), WEBHOOK_SECRET, WEBHOOK_PATH)
+    server = await asyncio.start_server(ingress.handle_connection, WEBHOOK_LISTEN, WEBHOOK_PORT)
+    logger.info(f"Ingress on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH} -> {args.workers} worker(s)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await ingress.close()
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Partition webhook updates across PadelBot workers by user id")
+    parser.add_argument('--workers', type=int, required=True)
+    parser.add_argument('--spawn', action='store_true', help="start the worker processes as well")
+    args = parser.parse_args()
+    if not WEBHOOK_SECRET:
+        parser.error("WEBHOOK_SECRET must be set")
+
+    workers = spawn_workers(args.workers) if args.spawn else []
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# metrics.py
+
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, label_values)))} {value}")
+        return lines
+
+
+handler_latency = Histogram(
+    'padelbot_handler_seconds', "Time spent in each update handler.", ('handler',), LATENCY_BUCKETS)
+query_latency = Histogram(
+    'padelbot_query_seconds', "Time spent executing SQL statements, by statement type.", ('statement',), LATENCY_BUCKETS)
+update_latency = Histogram(
+    'padelbot_update_seconds', "Total time to process one update.", (), LATENCY_BUCKETS)
+queries_per_update = Histogram(
+    'padelbot_queries_per_update', "SQL statements executed while processing one update.", (), COUNT_BUCKETS)
+handler_errors = Counter(
+    'padelbot_handler_errors_total', "Exceptions raised by update handlers.", ('handler',))
+
+_histograms = [handler_latency, query_latency, update_latency, queries_per_update]
+_counters = [handler_errors]
+_gauges = {}  # name -> (help text, callable returning {label tuple: value} or a number)
+
+# Statement counter for the update being processed; copied into DB executor threads by database.run_db
+_update_queries = contextvars.ContextVar('update_queries', default=None)
+
+
+def register_gauge(name, help_text, read):
+    """Expose a value sampled at scrape time. ``read`` returns a number or a {label value: number} dict."""
+    _gauges[name] = (help_text, read)
+
+
+def observe_query(statement, seconds):
+    words = statement.lstrip().split(None, 1)
+    query_latency.observe(seconds, words[0].upper() if words else '')
+    counter = _update_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def begin_update():
+    """Start counting statements for the current update; returns a token for end_update()."""
+    return _update_queries.set([0]), time.perf_counter()
+
+
+def end_update(token):
+    var_token, started = token
+    update_latency.observe(time.perf_counter() - started)
+    queries_per_update.observe(_update_queries.get()[0])
+    _update_queries.reset(var_token)
+
+
+def timed_handler(callback, name=None):
+    """Wrap a handler callback so each call is recorded in padelbot_handler_seconds."""
+    if getattr(callback, '__wrapped_by_metrics__', False):
+        return callback
+    name = name or getattr(callback, '__name__', repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
+
+    wrapper.__wrapped_by_metrics__ = True
+    return wrapper
+
+
+def render():
+    lines = []
+    for metric in _histograms + _counters:
+        lines.extend(metric.render())
+    for name, (help_text, read) in sorted(_gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        try:
+            value = read()
+        except Exception:
+            logger.exception(f"Failed to read gauge {name}")
+            continue
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                lines.append(f'{name}{{key="{label}"}} {item}')
+        else:
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+async def _serve(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        path = request_line.decode('latin-1').split(' ')[1] if request_line.count(b' ') >= 2 else ''
+        if path.split('?', 1)[0] == '/metrics':
+            body, status = render().encode('utf-8'), '200 OK'
+        else:
+            body, status = b'not found\n', '404 Not Found'
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+_server = None
+
+
+async def start_metrics_server(host, port):
+    """Serve GET /metrics in Prometheus text format on the running event loop.
+
+    A port that cannot be bound is logged and the bot runs on without metrics; returns None then.
+    """
+    global _server
+    if _server is None:
+        try:
+            _server = await asyncio.start_server(_serve, host, port)
+        except OSError as e:
+            logger.error(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+            return None
+        logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return _server
+
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        server, _server = _server, None
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,221 @@
+# migrate.py
+#
+# Versioned schema migrations. Scripts live in migrations/ as <version>_<name>.sql
+# and are applied in version order; applied versions are recorded in schema_migrations.
+#
+#     python migrate.py                 apply pending migrations
+#     python migrate.py status          list migrations and whether they are applied
+#     python migrate.py baseline 2      mark 0001..0002 as applied without running them
+#                                       (for databases set up by hand before migrations existed)
+#     python migrate.py check           EXPLAIN the hot queries and report any that scan a whole table or index
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+
+import mysql.connector
+
+from database import DB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# The queries run on every registration, cancellation and menu tap, with sample parameters.
+# Keep in step with the handlers; `check` fails if any of them stops using an index.
+# The schedule snapshot is left out: it reads every unfinished game, once per schedule change.
+HOT_QUERIES = [
+    ('player by telegram id or nickname (player_cache)',
+     "SELECT * FROM players WHERE telegram_id = %s OR nickname = %s ORDER BY telegram_id = %s DESC LIMIT 1",
+     (1, 'nickname', 1)),
+    ('player by nickname',
+     "SELECT * FROM players WHERE nickname = %s",
+     ('nickname',)),
+    ('players picker page',
+     "SELECT id, name, nickname FROM players WHERE active = TRUE AND id > %s ORDER BY id ASC LIMIT %s",
+     (0, 11)),
+    ('upcoming unfinished games',
+     "SELECT id FROM schedule WHERE event_date >= %s AND finished IS NULL",
+     ('2000-01-01',)),
+    ('registration duplicate check',
+     "SELECT s.capacity, s.main_count, "
+     "EXISTS(SELECT 1 FROM registrations r WHERE r.game_id = s.id AND r.player_id = %s) AS already_registered "
+     "FROM schedule s WHERE s.id = %s",
+     (1, 1)),
+    ('waitlist promotion',
+     "SELECT r.id, p.id AS player_id, p.telegram_id, p.nickname FROM registrations r "
+     "JOIN players p ON p.id = r.player_id WHERE r.game_id = %s AND r.waiting = TRUE ORDER BY r.id ASC LIMIT 1",
+     (1,)),
+    ('registration owned by player',
+     "SELECT game_id FROM registrations WHERE id = %s AND player_id = %s",
+     (1, 1)),
+    ('my games dashboard',
+     "SELECT r.id, r.game_id, r.confirmed, r.waiting, r.swap_requested, s.event_date, s.start_time, s.venue "
+     "FROM registrations r JOIN schedule s ON s.id = r.game_id "
+     "WHERE r.player_id = %s AND s.finished IS NULL AND s.event_date >= CURDATE() "
+     "ORDER BY s.event_date, s.start_time, s.id",
+     (1,)),
+    ('registrations of a game (delete_game)',
+     "SELECT id FROM registrations WHERE game_id = %s",
+     (1,)),
+]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, name, sql, checksum)] sorted by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+    migrations.sort()
+    versions = [migration[0] for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql):
+    """Split a script into statements on trailing semicolons, dropping '--' comment lines."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_migrations(cursor):
+    """Return {version: checksum} for the migrations recorded as applied."""
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def apply_pending(conn, migrations=None):
+    """Apply every migration not yet recorded. Returns the versions applied.
+
+    MySQL commits DDL implicitly, so a failing script can leave earlier statements
+    applied; the version is only recorded once the whole script has run.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        applied = applied_migrations(cursor)
+        done = []
+        for version, name, sql, checksum in migrations:
+            if version in applied:
+                if applied[version] != checksum:
+                    logger.warning(f"Migration {version:04d}_{name} changed after it was applied")
+                continue
+            logger.info(f"Applying migration {version:04d}_{name}")
+            for statement in split_statements(sql):
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (version, name, checksum)
+            )
+            conn.commit()
+            done.append(version)
+        return done
+    finally:
+        cursor.close()
+
+
+def baseline(conn, up_to, migrations=None):
+    """Record migrations up to and including ``up_to`` as applied without running them."""
+    migrations = load_migrations() if migrations is None else migrations
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        cursor.executemany(
+            "INSERT IGNORE INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+            [(version, name, checksum) for version, name, _, checksum in migrations if version <= up_to]
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+# EXPLAIN access types that read every row: a full table scan, and a full index scan
+FULL_SCANS = {'ALL': 'FULL SCAN', 'index': 'FULL INDEX SCAN'}
+
+
+def check_indexes(conn, queries=HOT_QUERIES):
+    """EXPLAIN each hot query; return [(query name, table, access type)] for every full table or index scan.
+
+    Run it against a database with realistic row counts: on near-empty tables the
+    optimizer may prefer a scan even when a suitable index exists.
+    """
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for name, query, params in queries:
+            cursor.execute("EXPLAIN " + query, params)
+            for row in cursor.fetchall():
+                # type is NULL when the optimizer resolved the table without reading it
+                if row['type'] in FULL_SCANS and not str(row['table']).startswith('<'):
+                    problems.append((name, row['table'], row['type']))
+    finally:
+        cursor.close()
+    return problems
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply and inspect PadelBot schema migrations")
+    parser.add_argument('command', nargs='?', default='up', choices=['up', 'status', 'baseline', 'check'])
+    parser.add_argument('version', nargs='?', type=int, help="last version to mark as applied (baseline only)")
+    parser.add_argument('--db', help="database to use instead of DB_NAME")
+    args = parser.parse_args()
+
+    config = dict(DB_CONFIG)
+    if args.db:
+        config['database'] = args.db
+    conn = mysql.connector.connect(**config)
+    try:
+        if args.command == 'up':
+            applied = apply_pending(conn)
+            print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ''))
+        elif args.command == 'status':
+            cursor = conn.cursor()
+            ensure_migrations_table(cursor)
+            applied = applied_migrations(cursor)
+            cursor.close()
+            for version, name, _, checksum in load_migrations():
+                state = 'pending'
+                if version in applied:
+                    state = 'applied' if applied[version] == checksum else 'applied (modified since)'
+                print(f"{version:04d}_{name:<40}{state}")
+        elif args.command == 'baseline':
+            if args.version is None:
+                parser.error("baseline needs the last version to mark as applied")
+            baseline(conn, args.version)
+        else:
+            problems = check_indexes(conn)
+            for name, table, access_type in problems:
+                print(f"{FULL_SCANS[access_type]}  {name}: table {table}")
+            print(f"{len(HOT_QUERIES) - len({name for name, _, _ in problems})}/{len(HOT_QUERIES)} hot queries use indexes")
+            if problems:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
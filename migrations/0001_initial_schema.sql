@@ -0,0 +1,29 @@
+-- Tables the bot has always assumed. IF NOT EXISTS lets this run against
+-- databases created by hand before migrations existed.
+
+CREATE TABLE IF NOT EXISTS players (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    telegram_id BIGINT NULL,
+    name VARCHAR(255) NOT NULL,
+    nickname VARCHAR(64) NOT NULL,
+    level VARCHAR(16) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedule (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    event_date DATE NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    venue VARCHAR(255) NOT NULL,
+    capacity INT NOT NULL,
+    finished DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    player_id INT NOT NULL,
+    game_id INT NOT NULL,
+    confirmed BOOLEAN NOT NULL DEFAULT FALSE,
+    waiting BOOLEAN NOT NULL DEFAULT FALSE,
+    swap_requested BOOLEAN NOT NULL DEFAULT FALSE
+);
@@ -0,0 +1,23 @@
+-- Per-game occupancy counters maintained by the bot on every registration change.
+-- main_count:      registrations on the main list (waiting = FALSE)
+-- confirmed_count: confirmed registrations
+-- waiting_count:   registrations on the waiting list (waiting = TRUE)
+
+ALTER TABLE schedule
+    ADD COLUMN main_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN confirmed_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN waiting_count INT NOT NULL DEFAULT 0;
+
+-- Backfill from existing registrations (same statement as the /recount_games admin command)
+UPDATE schedule s
+LEFT JOIN (
+    SELECT game_id,
+           SUM(waiting = FALSE) AS main_count,
+           SUM(confirmed = TRUE) AS confirmed_count,
+           SUM(waiting = TRUE) AS waiting_count
+    FROM registrations
+    GROUP BY game_id
+) r ON r.game_id = s.id
+SET s.main_count = COALESCE(r.main_count, 0),
+    s.confirmed_count = COALESCE(r.confirmed_count, 0),
+    s.waiting_count = COALESCE(r.waiting_count, 0);
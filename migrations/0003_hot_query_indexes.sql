@@ -0,0 +1,19 @@
+-- Indexes behind the hot queries, and the uniqueness the handlers rely on.
+-- Remove duplicate nicknames, registrations and games before applying.
+
+-- Player lookup by Telegram account (player_cache) and by nickname (admin-added players)
+ALTER TABLE players
+    ADD INDEX idx_players_telegram_id (telegram_id),
+    ADD UNIQUE INDEX uq_players_nickname (nickname);
+
+-- Schedule snapshot: unfinished games in date order; one game per slot and venue
+ALTER TABLE schedule
+    ADD INDEX idx_schedule_event_date_finished (event_date, finished),
+    ADD UNIQUE INDEX uq_schedule_slot (event_date, start_time, venue);
+
+-- Waitlist promotion (first waiting registration of a game), the "my registrations"
+-- lists, and one registration per player and game (also serves the duplicate check)
+ALTER TABLE registrations
+    ADD INDEX idx_registrations_game_waiting (game_id, waiting, id),
+    ADD INDEX idx_registrations_player_confirmed (player_id, confirmed),
+    ADD UNIQUE INDEX uq_registrations_player_game (player_id, game_id);
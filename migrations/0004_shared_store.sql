@@ -0,0 +1,19 @@
+-- Shared store for running several bot workers (SHARED_STORE=mysql).
+
+-- Pickled user_data and conversation states, keyed per namespace
+CREATE TABLE IF NOT EXISTS shared_state (
+    namespace VARCHAR(64) NOT NULL,
+    item_key VARCHAR(191) NOT NULL,
+    value LONGBLOB NOT NULL,
+    PRIMARY KEY (namespace, item_key)
+);
+
+-- Cache invalidations, polled by every worker in id order and pruned after an hour
+CREATE TABLE IF NOT EXISTS cache_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    origin VARCHAR(64) NOT NULL,
+    channel VARCHAR(64) NOT NULL,
+    message TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_cache_events_created_at (created_at)
+);
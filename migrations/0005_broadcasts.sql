@@ -0,0 +1,25 @@
+-- Admin broadcasts (broadcast.py). Recipients are streamed in player id order;
+-- last_player_id is the resume point, everyone up to it has been queued.
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    audience VARCHAR(16) NOT NULL,
+    level VARCHAR(16) NULL,
+    game_id INT NULL,
+    roster VARCHAR(16) NULL,
+    text TEXT NOT NULL,
+    admin_chat_id BIGINT NOT NULL,
+    status_message_id BIGINT NULL,
+    total INT NOT NULL DEFAULT 0,
+    queued INT NOT NULL DEFAULT 0,
+    last_player_id INT NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL DEFAULT 'running',
+    owner VARCHAR(64) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_broadcasts_status_updated (status, updated_at)
+);
+
+-- Level broadcasts walk one level's players in id order
+ALTER TABLE players
+    ADD INDEX idx_players_level (level, id);
@@ -0,0 +1,11 @@
+-- players.active, which the player pickers filter on. Databases set up by hand
+-- already have it, so the column is only added where it is missing.
+
+SET @add_active = (
+    SELECT IF(COUNT(*) = 0, 'ALTER TABLE players ADD COLUMN active BOOLEAN NOT NULL DEFAULT TRUE', 'DO 0')
+    FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = 'players' AND column_name = 'active'
+);
+PREPARE add_active FROM @add_active;
+EXECUTE add_active;
+DEALLOCATE PREPARE add_active;
@@ -0,0 +1,185 @@
+# notifications.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import (
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_PER_CHAT_INTERVAL,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_DEDUP_WINDOW,
+    NOTIFY_MAX_IN_FLIGHT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """Background sender for player notifications.
+
+    Handlers enqueue messages and return immediately. A single dispatcher task
+    sends them while respecting a global rate and a minimum interval per chat,
+    retries 429s and network errors with backoff, and drops duplicates seen
+    within the dedup window.
+    """
+
+    def __init__(self, global_rate, per_chat_interval, max_retries, dedup_window, max_in_flight):
+        self.global_interval = 1.0 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.dedup_window = dedup_window
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._heap = []  # (ready_at, seq, item)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._next_global_slot = 0.0
+        self._next_chat_slot = OrderedDict()  # chat id -> next send time, earliest first
+        self._recent = {}  # dedup key -> expires_at
+        self._bot = None
+        self._task = None
+        self.metrics = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'deduplicated': 0,
+            'rate_limited': 0,
+        }
+
+    def start(self, bot):
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, chat_id, text, dedup_key=None, **kwargs):
+        """Queue a message for delivery. Returns False if an identical message was queued recently."""
+        now = time.monotonic()
+        key = (chat_id, dedup_key if dedup_key is not None else text)
+        if self._recent.get(key, 0) > now:
+            self.metrics['deduplicated'] += 1
+            return False
+        self._recent[key] = now + self.dedup_window
+        if len(self._recent) > 10000:
+            self._recent = {k: expires for k, expires in self._recent.items() if expires > now}
+
+        item = {'chat_id': chat_id, 'text': text, 'kwargs': kwargs, 'attempt': 0}
+        self._push(now, item)
+        self.metrics['enqueued'] += 1
+        return True
+
+    def _push(self, ready_at, item):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), item))
+        self._wakeup.set()
+
+    def stats(self):
+        stats = dict(self.metrics)
+        stats['queued'] = len(self._heap)
+        stats['throttled_chats'] = len(self._next_chat_slot)
+        return stats
+
+    async def _dispatch(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._expire_chat_slots(now)
+            ready_at, _, item = self._heap[0]
+            chat_ready = self._next_chat_slot.get(item['chat_id'], 0.0)
+            wait = max(ready_at, chat_ready, self._next_global_slot) - now
+            if wait > 0:
+                if chat_ready > ready_at and chat_ready > self._next_global_slot:
+                    # Only this chat is throttled: requeue it behind its slot so other chats can go first
+                    heapq.heapreplace(self._heap, (chat_ready, next(self._seq), item))
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._next_global_slot = now + self.global_interval
+            self._next_chat_slot.pop(item['chat_id'], None)
+            self._next_chat_slot[item['chat_id']] = now + self.per_chat_interval
+            await self._in_flight.acquire()
+            asyncio.create_task(self._send(item))
+
+    def _expire_chat_slots(self, now):
+        # Every slot is set to now + per_chat_interval and moved to the end, so the
+        # dict stays in time order and chats that may send again drop off the front
+        while self._next_chat_slot:
+            chat_id, slot = next(iter(self._next_chat_slot.items()))
+            if slot > now:
+                break
+            del self._next_chat_slot[chat_id]
+
+    async def _send(self, item):
+        try:
+            await self._bot.send_message(chat_id=item['chat_id'], text=item['text'], **item['kwargs'])
+            self.metrics['sent'] += 1
+        except RetryAfter as e:
+            self.metrics['rate_limited'] += 1
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            # Telegram asked us to back off: hold every chat, not just this one
+            self._next_global_slot = max(self._next_global_slot, time.monotonic() + retry_after)
+            self._retry(item, retry_after)
+        except (Forbidden, BadRequest) as e:
+            self.metrics['failed'] += 1
+            logger.warning(f"Dropping notification to {item['chat_id']}: {e}")
+        except NetworkError as e:
+            self._retry(item, min(2 ** item['attempt'], 60), error=e)
+        except Exception:
+            self.metrics['failed'] += 1
+            logger.exception(f"Failed to send notification to {item['chat_id']}")
+        finally:
+            self._in_flight.release()
+
+    def _retry(self, item, delay, error=None):
+        item['attempt'] += 1
+        if item['attempt'] > self.max_retries:
+            self.metrics['failed'] += 1
+            logger.warning(f"Giving up on notification to {item['chat_id']} after {self.max_retries} retries: {error}")
+            return
+        self.metrics['retried'] += 1
+        self._push(time.monotonic() + delay, item)
+
+
+notification_queue = NotificationQueue(
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_PER_CHAT_INTERVAL,
+    NOTIFY_MAX_RETRIES,
+    NOTIFY_DEDUP_WINDOW,
+    NOTIFY_MAX_IN_FLIGHT,
+)
+
+
+def notify(chat_id, text, dedup_key=None, **kwargs):
+    """Queue a message to a player without waiting for delivery."""
+    return notification_queue.enqueue(chat_id, text, dedup_key=dedup_key, **kwargs)
+
+
+async def start_notifications(application):
+    notification_queue.start(application.bot)
+
+
+async def stop_notifications(application):
+    await notification_queue.stop()
@@ -0,0 +1,191 @@
+# persistence.py
+
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+from collections import defaultdict
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindPersistence(BasePersistence):
+    """Stores user_data and conversation states, buffering writes.
+
+    The Application hands over changed entries every ``update_interval``
+    seconds, and each batch is written in one go by ``_write_batch``, so
+    handlers never wait on storage. Subclasses provide the loading and writing.
+    """
+
+    def __init__(self, update_interval=10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._pending_user_data = {}  # user_id -> pickled dict, or None to delete
+        self._pending_conversations = {}  # (name, key) -> state
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    async def _write_batch(self, user_data, conversations):
+        raise NotImplementedError
+
+    async def _close(self):
+        pass
+
+    # Only user_data and conversations are kept; loading happens once at startup
+
+    async def get_chat_data(self):
+        return defaultdict(dict)
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # Writes are buffered and flushed in batches
+
+    async def update_user_data(self, user_id, data):
+        self._pending_user_data[user_id] = pickle.dumps(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        self._pending_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write everything still buffered; called on shutdown."""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_pending()
+        await self._close()
+
+    def _schedule_flush(self):
+        # The Application updates all changed users in one burst; yield once so the whole burst shares a transaction
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(0)
+        try:
+            await self._write_pending()
+        except Exception:
+            logger.exception("Failed to persist user data")
+
+    async def _write_pending(self):
+        async with self._lock:
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            if user_data or conversations:
+                await self._write_batch(user_data, conversations)
+
+
+class SQLitePersistence(WriteBehindPersistence):
+    """Stores user_data and conversation states in a local SQLite file, one transaction per batch."""
+
+    def __init__(self, path, update_interval=10):
+        super().__init__(update_interval)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations (name TEXT NOT NULL, conv_key TEXT NOT NULL, state BLOB, "
+            "PRIMARY KEY (name, conv_key))"
+        )
+        self._conn.commit()
+
+    async def get_user_data(self):
+        rows = await asyncio.to_thread(self._select, "SELECT user_id, data FROM user_data")
+        user_data = defaultdict(dict)
+        for user_id, data in rows:
+            user_data[user_id] = pickle.loads(data)
+        return user_data
+
+    async def get_conversations(self, name):
+        rows = await asyncio.to_thread(self._select, "SELECT conv_key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def _write_batch(self, user_data, conversations):
+        await asyncio.to_thread(self._write, user_data, conversations)
+
+    async def _close(self):
+        self._conn.close()
+
+    def _select(self, query, params=()):
+        return self._conn.execute(query, params).fetchall()
+
+    def _write(self, user_data, conversations):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                [(user_id, data) for user_id, data in user_data.items() if data is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM user_data WHERE user_id = ?",
+                [(user_id,) for user_id, data in user_data.items() if data is None],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conversations (name, conv_key, state) VALUES (?, ?, ?)",
+                [(name, key, pickle.dumps(state)) for (name, key), state in conversations.items() if state is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM conversations WHERE name = ? AND conv_key = ?",
+                [(name, key) for (name, key), state in conversations.items() if state is None],
+            )
+
+
+class SharedStorePersistence(WriteBehindPersistence):
+    """Keeps user_data and conversation states in the shared store, so any worker can pick a user up."""
+
+    def __init__(self, store, update_interval=10):
+        super().__init__(update_interval)
+        self.store = store
+
+    async def get_user_data(self):
+        user_data = defaultdict(dict)
+        for user_id, data in (await self.store.items('user_data')).items():
+            user_data[int(user_id)] = pickle.loads(data)
+        return user_data
+
+    async def get_conversations(self, name):
+        items = await self.store.items(f"conversation:{name}")
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in items.items()}
+
+    async def _write_batch(self, user_data, conversations):
+        if user_data:
+            await self.store.write('user_data', {str(user_id): data for user_id, data in user_data.items()})
+        by_name = defaultdict(dict)
+        for (name, key), state in conversations.items():
+            by_name[name][key] = pickle.dumps(state) if state is not None else None
+        for name, changes in by_name.items():
+            await self.store.write(f"conversation:{name}", changes)
@@ -0,0 +1,184 @@
+# pickers.py
+
+import bisect
+import datetime
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+from config import ADMIN_USERNAMES, PICKER_PAGE_SIZE
+from database import fetch_all
+from schedule_cache import schedule_snapshot
+from callbacks import CALLBACK_SEP, MAX_CALLBACK_DATA, callback_args, make_callback
+
+# Telegram limits callback_data to 64 bytes, so search prefixes are cut to what is left
+# of a players_page callback with the longest action, direction and id (INT max)
+MAX_PREFIX_BYTES = MAX_CALLBACK_DATA - len(CALLBACK_SEP.join(['players_page', 'remove', 'prev', '2147483647', '']))
+
+# action -> (item callback prefix, prompt)
+PLAYER_PICKERS = {
+    'edit': ('edit_player', "Select a player to edit:"),
+    'remove': ('remove_player', "Select a player to remove:"),
+}
+
+# action -> (item callback prefix, prompt, snapshot label)
+GAME_PICKERS = {
+    'edit': ('edit_game', "Select a game to edit:", 'edit_label'),
+    'remove': ('remove_game', "Select a game to remove:", 'remove_label'),
+}
+
+
+def _truncate_prefix(prefix):
+    """Cut prefix to MAX_PREFIX_BYTES of UTF-8 without splitting a character."""
+    return prefix.encode('utf-8')[:MAX_PREFIX_BYTES].decode('utf-8', 'ignore')
+
+
+def _escape_like(prefix):
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _nav_row(prev_data, next_data):
+    row = []
+    if prev_data:
+        row.append(InlineKeyboardButton("« Prev", callback_data=prev_data))
+    if next_data:
+        row.append(InlineKeyboardButton("Next »", callback_data=next_data))
+    return row
+
+
+async def player_picker(action, anchor_id=0, direction='next', prefix=''):
+    """Build one page of active players, keyset-paginated on id, optionally filtered by name/nickname prefix.
+
+    Returns (text, reply_markup), or None when no player matches.
+    """
+    item_prefix, prompt = PLAYER_PICKERS[action]
+    prefix = _truncate_prefix(prefix)
+
+    conditions = ["active = TRUE"]
+    params = []
+    if direction == 'next':
+        conditions.append("id > %s")
+    else:
+        conditions.append("id < %s")
+    params.append(anchor_id)
+    if prefix:
+        pattern = _escape_like(prefix) + '%'
+        conditions.append("(name LIKE %s OR nickname LIKE %s)")
+        params.extend([pattern, pattern])
+    order = "ASC" if direction == 'next' else "DESC"
+
+    # Fetch one extra row to learn whether another page exists
+    players = await fetch_all(
+        f"SELECT id, name, nickname FROM players WHERE {' AND '.join(conditions)} ORDER BY id {order} LIMIT %s",
+        tuple(params) + (PICKER_PAGE_SIZE + 1,),
+        readonly=True
+    )
+    has_more = len(players) > PICKER_PAGE_SIZE
+    players = players[:PICKER_PAGE_SIZE]
+    if direction != 'next':
+        players.reverse()
+    if not players:
+        return None
+
+    if direction == 'next':
+        has_prev, has_next = anchor_id > 0, has_more
+    else:
+        has_prev, has_next = has_more, True
+
+    buttons = []
+    for player in players:
+        player_id = player[0]
+        name = player[1]
+        nickname = player[2]
+        button_text = f"{player_id}: {name} ({nickname})"
+        buttons.append([InlineKeyboardButton(button_text, callback_data=make_callback(item_prefix, player_id))])
+
+    first_id, last_id = players[0][0], players[-1][0]
+    nav = _nav_row(
+        make_callback('players_page', action, 'prev', first_id, prefix) if has_prev else None,
+        make_callback('players_page', action, 'next', last_id, prefix) if has_next else None,
+    )
+    if nav:
+        buttons.append(nav)
+
+    text = prompt if not prefix else f"{prompt} (matching '{prefix}')"
+    return text, InlineKeyboardMarkup(buttons)
+
+
+def _game_key(game):
+    return (game['event_date'], game['start_time'], game['id'])
+
+
+def _encode_game_key(game):
+    return (f"{game['event_date']:%Y%m%d}", game['start_time'].replace(':', ''), game['id'])
+
+
+def _decode_game_key(event_date, start_time, game_id):
+    event_date = datetime.datetime.strptime(event_date, '%Y%m%d').date()
+    start_time = f"{start_time[:2]}:{start_time[2:]}"
+    return (event_date, start_time, game_id)
+
+
+async def game_picker(action, anchor=None, direction='next'):
+    """Build one page of unfinished games from the schedule snapshot, keyset-paginated on (date, start, id).
+
+    Returns (text, reply_markup), or None when there are no games.
+    """
+    item_prefix, prompt, label = GAME_PICKERS[action]
+    games = await schedule_snapshot.games()
+    keys = [_game_key(game) for game in games]
+
+    if anchor is None:
+        start = 0
+    elif direction == 'next':
+        start = bisect.bisect_right(keys, anchor)
+    else:
+        start = max(bisect.bisect_left(keys, anchor) - PICKER_PAGE_SIZE, 0)
+    page = games[start:start + PICKER_PAGE_SIZE]
+    if not page:
+        return None
+
+    buttons = [[InlineKeyboardButton(game[label], callback_data=make_callback(item_prefix, game['id']))] for game in page]
+    nav = _nav_row(
+        make_callback('games_page', action, 'prev', *_encode_game_key(page[0])) if start > 0 else None,
+        make_callback('games_page', action, 'next', *_encode_game_key(page[-1])) if start + PICKER_PAGE_SIZE < len(games) else None,
+    )
+    if nav:
+        buttons.append(nav)
+    return prompt, InlineKeyboardMarkup(buttons)
+
+
+#Handle player picker page turns
+async def handle_players_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    if query.from_user.username not in ADMIN_USERNAMES:
+        await query.edit_message_text("You do not have permission to manage players.")
+        return
+
+    action, direction, anchor_id, prefix = callback_args(context)
+    picker = await player_picker(action, anchor_id, direction, prefix)
+    if picker is None:
+        await query.edit_message_text("There are no more players.")
+        return
+    text, reply_markup = picker
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+
+#Handle game picker page turns
+async def handle_games_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    if query.from_user.username not in ADMIN_USERNAMES:
+        await query.edit_message_text("You do not have permission to manage games.")
+        return
+
+    action, direction, event_date, start_time, game_id = callback_args(context)
+    picker = await game_picker(action, _decode_game_key(event_date, start_time, game_id), direction)
+    if picker is None:
+        await query.edit_message_text("There are no more games.")
+        return
+    text, reply_markup = picker
+    await query.edit_message_text(text, reply_markup=reply_markup)
@@ -0,0 +1,133 @@
+# player_cache.py
+
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import PLAYER_CACHE_SIZE, PLAYER_CACHE_TTL
+from database import connect_db, run_db, set_session
+from shared_store import on_invalidation, publish_invalidation
+
+
+class PlayerCache:
+    """Bounded LRU cache of player rows keyed by Telegram user id, with a TTL per entry.
+
+    Unregistered users are cached too (as None) so repeated taps from them do
+    not hit the database; registration invalidates those entries.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # telegram_id -> (player, nickname, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id):
+        """Return (found, player) for a Telegram user id."""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[2] < time.monotonic():
+            self._entries.pop(telegram_id, None)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(self, telegram_id, nickname, player):
+        self._entries[telegram_id] = (player, nickname, time.monotonic() + self.ttl)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id=None, player_id=None, nickname=None):
+        """Drop entries matching any of the given Telegram id, player id or nickname."""
+        if telegram_id is not None:
+            self._entries.pop(telegram_id, None)
+        if player_id is None and nickname is None:
+            return
+        stale = [
+            key for key, (player, cached_nickname, _) in self._entries.items()
+            if (player_id is not None and player is not None and player['id'] == player_id)
+            or (nickname is not None and (cached_nickname == nickname
+                                          or (player is not None and player['nickname'] == nickname)))
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+player_cache = PlayerCache(PLAYER_CACHE_SIZE, PLAYER_CACHE_TTL)
+
+
+def _load_player(telegram_id, nickname):
+    # Players added by an admin or by CSV import only have a nickname; the first time
+    # they use the bot their Telegram id is stored, so broadcasts can reach them. A
+    # nickname only matches a row not yet linked to an account: Telegram usernames
+    # can change hands, and a new owner of the name must not act as that player
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT * FROM players
+            WHERE telegram_id = %s OR (nickname = %s AND telegram_id IS NULL)
+            ORDER BY telegram_id = %s DESC
+            LIMIT 1
+        """, (telegram_id, nickname, telegram_id))
+        player = cursor.fetchone()
+        if player is not None and player['telegram_id'] is None:
+            cursor.execute("UPDATE players SET telegram_id = %s WHERE id = %s AND telegram_id IS NULL",
+                           (telegram_id, player['id']))
+            conn.commit()
+            if not cursor.rowcount:
+                # Another account linked the row first
+                return None
+            player['telegram_id'] = telegram_id
+        return player
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def resolve_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pre-handler stage: attach the sender's player row (or None) to context.player."""
+    user = update.effective_user
+    # Database work for this update counts as the sender's, for read-your-writes routing
+    set_session(user.id if user else None)
+    if user is None:
+        return
+
+    found, player = player_cache.get(user.id)
+    if not found:
+        player = await run_db(_load_player, user.id, user.username)
+        player_cache.put(user.id, user.username, player)
+    context.player = player
+
+
+def get_current_player(context: ContextTypes.DEFAULT_TYPE):
+    """Return the player resolved for the current update, or None if unregistered."""
+    return getattr(context, 'player', None)
+
+
+def invalidate_player(telegram_id=None, player_id=None, nickname=None):
+    player_cache.invalidate(telegram_id=telegram_id, player_id=player_id, nickname=nickname)
+    publish_invalidation('player', telegram_id=telegram_id, player_id=player_id, nickname=nickname)
+
+
+def invalidate_all_players():
+    player_cache.clear()
+    publish_invalidation('all_players')
+
+
+@on_invalidation('player')
+def _invalidated_elsewhere(message):
+    player_cache.invalidate(**message)
+
+
+@on_invalidation('all_players')
+def _cleared_elsewhere(message):
+    player_cache.clear()
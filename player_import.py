@@ -0,0 +1,56 @@
+# player_import.py
+
+import csv
+import io
+
+from config import IMPORT_BATCH_SIZE
+from database import upsert_players
+
+VALID_LEVELS = ['Novice', 'D-', 'D', 'D+', 'C-', 'C', 'C+']
+HEADER = ['name', 'nickname', 'level']
+MAX_NICKNAME_LENGTH = 64
+MAX_NAME_LENGTH = 255
+
+
+def parse_players_csv(stream):
+    """Validate name,nickname,level rows from a text stream.
+
+    Returns (players, errors): players as (name, nickname, level) tuples, errors as
+    (line number, message). A header row is optional; a leading '@' on nicknames is dropped.
+    """
+    players = []
+    errors = []
+    seen = {}
+    for line_no, row in enumerate(csv.reader(stream), start=1):
+        if not any(cell.strip() for cell in row):
+            continue
+        if line_no == 1 and [cell.strip().lower() for cell in row] == HEADER:
+            continue
+        if len(row) != 3:
+            errors.append((line_no, f"expected 3 columns (name, nickname, level), got {len(row)}"))
+            continue
+        name, nickname, level = (cell.strip() for cell in row)
+        nickname = nickname.lstrip('@')
+        if not name or len(name) > MAX_NAME_LENGTH:
+            errors.append((line_no, "name is empty or too long"))
+        elif not nickname or len(nickname) > MAX_NICKNAME_LENGTH or ' ' in nickname:
+            errors.append((line_no, f"invalid nickname {nickname!r}"))
+        elif level not in VALID_LEVELS:
+            errors.append((line_no, f"invalid level {level!r}, expected one of {', '.join(VALID_LEVELS)}"))
+        elif nickname.lower() in seen:
+            errors.append((line_no, f"nickname {nickname} already appears on line {seen[nickname.lower()]}"))
+        else:
+            seen[nickname.lower()] = line_no
+            players.append((name, nickname, level))
+    return players, errors
+
+
+def import_players(data):
+    """Parse and upsert an uploaded CSV (bytes). Blocking; run it via run_db.
+
+    Returns (inserted, updated, errors).
+    """
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+    players, errors = parse_players_csv(stream)
+    inserted, updated = upsert_players(players, IMPORT_BATCH_SIZE)
+    return inserted, updated, errors
@@ -1,6 +1,7 @@
 # registration_handlers.py
 
-from database import connect_db
+from database import execute
+from player_cache import invalidate_player
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 import logging
@@ -31,13 +32,11 @@ async def handle_registration(update: Update, context: ContextTypes.DEFAULT_TYPE
             nickname = update.message.from_user.username
             user_id = update.effective_user.id
 
-            conn = connect_db()
-            cursor = conn.cursor()
             try:
-                cursor.execute('''INSERT INTO players (telegram_id, name, nickname, level)
-                                  VALUES (%s, %s, %s, %s)''',
-                               (user_id, name, nickname, level))
-                conn.commit()
+                await execute('''INSERT INTO players (telegram_id, name, nickname, level)
+                                 VALUES (%s, %s, %s, %s)''',
+                              (user_id, name, nickname, level))
+                invalidate_player(telegram_id=user_id, nickname=nickname)
                 await update.message.reply_text("You have been registered successfully.")
                 logger.info("Registration successful.")
                 context.user_data.clear()
@@ -45,9 +44,6 @@ async def handle_registration(update: Update, context: ContextTypes.DEFAULT_TYPE
                 logger.exception("Error during registration")
                 await update.message.reply_text("An error occurred during registration. Please try again.")
                 return ConversationHandler.END
-            finally:
-                cursor.close()
-                conn.close()
 
             context.user_data.clear()
             # Proceed to show the player menu
@@ -0,0 +1,100 @@
+# schedule_cache.py
+
+import asyncio
+import datetime
+import logging
+
+from database import fetch_all
+from shared_store import on_invalidation, publish_invalidation
+from utils import format_timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleSnapshot:
+    """In-memory copy of all unfinished games, sorted by date, with pre-rendered button labels.
+
+    The snapshot is rebuilt only when an admin adds, edits or removes a game,
+    so browsing the schedule costs no database queries.
+    """
+
+    def __init__(self):
+        self._games = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def _load(self):
+        rows = await fetch_all("""
+            SELECT id, event_date, start_time, end_time, venue, capacity
+            FROM schedule
+            WHERE finished IS NULL
+            ORDER BY event_date ASC, start_time ASC, id ASC
+        """, dictionary=True)
+        games = []
+        for row in rows:
+            start_time = format_timedelta(row['start_time'])
+            end_time = format_timedelta(row['end_time'])
+            event_date = row['event_date']
+            venue = row['venue']
+            games.append({
+                'id': row['id'],
+                'event_date': event_date,
+                'start_time': start_time,
+                'end_time': end_time,
+                'venue': venue,
+                'capacity': row['capacity'],
+                'register_label': f"{event_date} at {start_time} at {venue}",
+                'list_label': f"{event_date} at {start_time} - {venue}",
+                'remove_label': f"{row['id']}: {venue} on {event_date} at {start_time}",
+                'edit_label': f"{event_date} {start_time} - {end_time} - {venue}",
+            })
+        return games
+
+    async def games(self):
+        """Return all unfinished games, loading the snapshot on first use."""
+        games = self._games
+        if games is not None:
+            return games
+        async with self._lock:
+            # Reload if an admin change landed while we were reading
+            while self._games is None:
+                generation = self._generation
+                games = await self._load()
+                if generation == self._generation:
+                    self._games = games
+            return self._games
+
+    async def upcoming_games(self):
+        """Return unfinished games dated today or later."""
+        today = datetime.date.today()
+        return [game for game in await self.games() if game['event_date'] >= today]
+
+    @property
+    def generation(self):
+        """Bumped on every schedule change; lets dependent caches notice they are stale."""
+        return self._generation
+
+    def invalidate(self):
+        self._generation += 1
+        self._games = None
+
+    async def refresh(self):
+        """Drop the snapshot after a committed schedule change and rebuild it straight away.
+
+        Other workers drop theirs too and reload on their next read.
+        """
+        self.invalidate()
+        publish_invalidation('schedule')
+        try:
+            await self.games()
+        except Exception:
+            # The change is already committed; the next reader retries the load
+            logger.exception("Failed to rebuild schedule snapshot")
+
+
+schedule_snapshot = ScheduleSnapshot()
+
+
+@on_invalidation('schedule')
+def _invalidated_elsewhere(message):
+    schedule_snapshot.invalidate()
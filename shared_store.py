@@ -0,0 +1,228 @@
+# shared_store.py
+
+import asyncio
+import json
+import logging
+
+from config import SHARED_STORE, SHARED_STORE_POLL_INTERVAL, WORKER_ID
+from database import connect_db, execute, fetch_all, fetch_one, run_db
+
+logger = logging.getLogger(__name__)
+
+
+class LocalHub:
+    """Data and message bus shared by LocalStore clients in one process."""
+
+    def __init__(self):
+        self.data = {}  # (namespace, key) -> bytes
+        self.stores = []
+
+
+class LocalStore:
+    """In-process stand-in for the shared store, for single-process runs and tests.
+
+    Several LocalStores created on the same hub behave like workers sharing one
+    backend: they see each other's data, and each receives the others' messages.
+    """
+
+    def __init__(self, worker_id, hub=None):
+        self.worker_id = worker_id
+        self.hub = hub or LocalHub()
+        self.hub.stores.append(self)
+        self._subscribers = []
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def items(self, namespace):
+        return {key: value for (ns, key), value in self.hub.data.items() if ns == namespace}
+
+    async def write(self, namespace, changes):
+        """Apply {key: bytes} in one batch; a value of None deletes the key."""
+        for key, value in changes.items():
+            if value is None:
+                self.hub.data.pop((namespace, key), None)
+            else:
+                self.hub.data[(namespace, key)] = value
+
+    async def publish(self, channel, message):
+        for store in self.hub.stores:
+            if store is not self:
+                store._deliver(channel, message)
+
+    def subscribe(self, callback):
+        """Call callback(channel, message) for every message published by another worker."""
+        self._subscribers.append(callback)
+
+    def _deliver(self, channel, message):
+        for callback in self._subscribers:
+            try:
+                callback(channel, message)
+            except Exception:
+                logger.exception(f"Invalidation handler failed for {channel!r}")
+
+
+class MySQLStore(LocalStore):
+    """Shared store on the bot's MySQL database (tables from migration 0004).
+
+    Data lives in shared_state; messages are rows in cache_events that every
+    worker polls every ``poll_interval`` seconds, skipping its own.
+
+    Auto-increment ids are handed out at insert time, not commit time, so an
+    event can become visible after a later one. Each poll therefore re-reads the
+    last ``lookback`` ids and skips the events it has already delivered.
+    """
+
+    def __init__(self, worker_id, poll_interval, lookback=1000):
+        super().__init__(worker_id)
+        self.poll_interval = poll_interval
+        self.lookback = lookback
+        self._last_event_id = None
+        self._seen = set()  # ids above _last_event_id - lookback that were already handled
+        self._poller = None
+
+    async def start(self):
+        row = await fetch_one("SELECT COALESCE(MAX(id), 0) FROM cache_events")
+        self._last_event_id = row[0]
+        # Events from before this worker started are not for it
+        rows = await fetch_all("SELECT id FROM cache_events WHERE id > %s", (self._last_event_id - self.lookback,))
+        self._seen = {event_id for event_id, in rows}
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    async def items(self, namespace):
+        rows = await fetch_all("SELECT item_key, value FROM shared_state WHERE namespace = %s", (namespace,))
+        return {key: bytes(value) for key, value in rows}
+
+    async def write(self, namespace, changes):
+        await run_db(_write_shared_state, namespace, changes)
+
+    async def publish(self, channel, message):
+        await execute(
+            "INSERT INTO cache_events (origin, channel, message) VALUES (%s, %s, %s)",
+            (self.worker_id, channel, json.dumps(message))
+        )
+
+    def _unseen(self, rows):
+        """Events in rows not handled before, in id order; advances the poll cursor."""
+        events = []
+        for event_id, origin, channel, message in rows:
+            if event_id in self._seen:
+                continue
+            self._seen.add(event_id)
+            self._last_event_id = max(self._last_event_id, event_id)
+            if origin != self.worker_id:
+                events.append((channel, json.loads(message)))
+        floor = self._last_event_id - self.lookback
+        self._seen = {event_id for event_id in self._seen if event_id > floor}
+        return events
+
+    async def _poll(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await fetch_all(
+                    "SELECT id, origin, channel, message FROM cache_events WHERE id > %s ORDER BY id LIMIT %s",
+                    (self._last_event_id - self.lookback, self.lookback + 500)
+                )
+                for channel, message in self._unseen(rows):
+                    self._deliver(channel, message)
+                polls += 1
+                if polls % 1000 == 0:
+                    # Every worker has long since seen these
+                    await execute("DELETE FROM cache_events WHERE created_at < NOW() - INTERVAL 1 HOUR")
+            except Exception:
+                logger.exception("Failed to poll cache events")
+
+
+def _write_shared_state(namespace, changes):
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        upserts = [(namespace, key, value) for key, value in changes.items() if value is not None]
+        deletes = [(namespace, key) for key, value in changes.items() if value is None]
+        if upserts:
+            cursor.executemany(
+                "INSERT INTO shared_state (namespace, item_key, value) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE value = VALUES(value)",
+                upserts
+            )
+        if deletes:
+            cursor.executemany("DELETE FROM shared_state WHERE namespace = %s AND item_key = %s", deletes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _create_store():
+    if SHARED_STORE == 'mysql':
+        return MySQLStore(WORKER_ID, SHARED_STORE_POLL_INTERVAL)
+    return LocalStore(WORKER_ID)
+
+
+store = _create_store()
+
+_handlers = {}  # channel -> [callback(message)]
+_publishing = set()
+
+
+def on_invalidation(channel):
+    """Register a function applying another worker's invalidation locally. Use as a decorator."""
+    def register(callback):
+        _handlers.setdefault(channel, []).append(callback)
+        return callback
+    return register
+
+
+def _dispatch(channel, message):
+    for callback in _handlers.get(channel, ()):
+        callback(message)
+
+
+store.subscribe(_dispatch)
+
+
+def publish_invalidation(channel, **message):
+    """Tell the other workers to drop cached state; returns at once, delivery happens in the background."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning(f"No event loop to publish {channel!r} invalidation")
+        return
+    task = loop.create_task(_publish(channel, message))
+    _publishing.add(task)
+    task.add_done_callback(_publishing.discard)
+
+
+async def _publish(channel, message):
+    try:
+        await store.publish(channel, message)
+    except Exception:
+        logger.exception(f"Failed to publish {channel!r} invalidation")
+
+
+async def start_shared_store(application=None):
+    await store.start()
+
+
+async def stop_shared_store(application=None):
+    # Let invalidations already issued reach the other workers
+    if _publishing:
+        await asyncio.gather(*_publishing, return_exceptions=True)
+    await store.stop()
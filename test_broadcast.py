@@ -0,0 +1,151 @@
+# test_broadcast.py
+
+import asyncio
+
+import pytest
+
+import broadcast
+from broadcast import BroadcastRunner, _audience_clause, parse_broadcast
+from config import WORKER_ID
+
+
+def test_parse_keeps_the_message_text_intact():
+    target, text = parse_broadcast("/broadcast all Courts are closed today.\nSee you next week!")
+    assert target['audience'] == 'all'
+    assert text == "Courts are closed today.\nSee you next week!"
+
+
+def test_parse_level_and_game_rosters():
+    target, text = parse_broadcast("/broadcast level C+ Hi there")
+    assert (target['audience'], target['level'], text) == ('level', 'C+', "Hi there")
+
+    target, text = parse_broadcast("/broadcast game 12 waiting You may still get a spot")
+    assert (target['game_id'], target['roster'], text) == (12, 'waiting', "You may still get a spot")
+
+    target, text = parse_broadcast("/broadcast game 12 Rain expected")
+    assert (target['roster'], text) == ('all', "Rain expected")
+
+
+@pytest.mark.parametrize('message', [
+    "/broadcast",
+    "/broadcast all",
+    "/broadcast level Z hello",
+    "/broadcast game twelve hello",
+    "/broadcast everyone hello",
+])
+def test_parse_rejects_bad_commands(message):
+    with pytest.raises(ValueError):
+        parse_broadcast(message)
+
+
+def test_player_audiences_only_include_active_players():
+    for message in ("/broadcast all hi", "/broadcast level C hi"):
+        clause, _ = _audience_clause(parse_broadcast(message)[0])
+        assert 'p.active = TRUE' in clause
+
+
+class FakeBroadcasts:
+    """In-memory broadcasts table and player list standing in for MySQL."""
+
+    def __init__(self, monkeypatch, players):
+        self.players = players
+        self.rows = {}
+        self.sent = []
+        for name in ('next_recipients', 'set_status', 'claim_job', 'is_running_here', 'save_progress',
+                     'finish_job', 'load_job', 'notify'):
+            monkeypatch.setattr(broadcast, name, getattr(self, name))
+
+    def add(self, owner=WORKER_ID):
+        job = {'id': len(self.rows) + 1, 'audience': 'all', 'level': None, 'game_id': None, 'roster': None,
+               'text': "Courts are closed today", 'admin_chat_id': 1, 'status_message_id': None,
+               'total': len(self.players), 'queued': 0, 'last_player_id': 0, 'status': 'running', 'owner': owner}
+        self.rows[job['id']] = dict(job)
+        return job
+
+    async def next_recipients(self, job, chunk_size):
+        return [(player_id, 1000 + player_id) for player_id in self.players
+                if player_id > job['last_player_id']][:chunk_size]
+
+    async def set_status(self, job_id, status, from_statuses):
+        row = self.rows[job_id]
+        if row['status'] not in from_statuses:
+            return False
+        row['status'] = status
+        return True
+
+    async def claim_job(self, job_id):
+        if self.rows[job_id]['status'] == 'running':
+            self.rows[job_id]['owner'] = WORKER_ID
+
+    async def is_running_here(self, job_id):
+        row = self.rows[job_id]
+        return row['status'] == 'running' and row['owner'] == WORKER_ID
+
+    async def save_progress(self, job):
+        row = self.rows[job['id']]
+        if row['owner'] == WORKER_ID:
+            row.update(queued=job['queued'], last_player_id=job['last_player_id'])
+
+    async def finish_job(self, job):
+        row = self.rows[job['id']]
+        if row['status'] == 'running' and row['owner'] == WORKER_ID:
+            row.update(queued=job['queued'], last_player_id=job['last_player_id'], status='done')
+
+    async def load_job(self, job_id):
+        return dict(self.rows[job_id])
+
+    def notify(self, chat_id, text, dedup_key=None):
+        self.sent.append(chat_id)
+
+
+def make_runner():
+    return BroadcastRunner(rate=1000, chunk_size=200, max_backlog=50, progress_interval=60, stale_after=60)
+
+
+async def wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.parametrize('local', [True, False])
+def test_pause_then_resume_sends_each_message_once(monkeypatch, local):
+    table = FakeBroadcasts(monkeypatch, players=list(range(1, 501)))
+    runner = make_runner()
+
+    async def scenario():
+        job = table.add()
+        runner.run(job)
+        await wait_for(lambda: len(table.sent) >= 30)
+        await table.set_status(job['id'], 'paused', ('running',))
+        if local:
+            await runner.stop_local(job['id'])
+        else:
+            # Paused from another worker: the task notices before its next message
+            await wait_for(lambda: not runner.stats()['running'])
+        paused = dict(table.rows[job['id']])
+        sent_before_resume = len(table.sent)
+
+        await table.set_status(job['id'], 'running', ('paused',))
+        await runner.resume(job['id'])
+        await wait_for(lambda: not runner.stats()['running'])
+        return paused, sent_before_resume
+
+    paused, sent_before_resume = asyncio.run(scenario())
+    assert paused['last_player_id'] == sent_before_resume
+    assert paused['queued'] == sent_before_resume
+    assert table.sent == [1000 + player_id for player_id in range(1, 501)]
+    assert table.rows[1]['status'] == 'done'
+
+
+def test_a_job_owned_by_another_live_worker_is_left_to_it(monkeypatch):
+    monkeypatch.setattr(broadcast, 'WORKER_INDEX', 1)
+    table = FakeBroadcasts(monkeypatch, players=[1, 2, 3])
+    runner = make_runner()
+
+    async def scenario():
+        job = table.add(owner='other-worker')
+        await runner.resume(job['id'])
+        return runner.stats()['running']
+
+    assert asyncio.run(scenario()) == 0
+    assert table.sent == []
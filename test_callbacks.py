@@ -0,0 +1,155 @@
+# test_callbacks.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from callbacks import CALLBACK_SEP, MAX_CALLBACK_DATA, CallbackRouter, make_callback, make_signed_callback
+
+
+class FakeQuery:
+    def __init__(self, query_id, user_id, data):
+        self.id = query_id
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+def tap(router, query_id, user_id, data):
+    query = FakeQuery(query_id, user_id, data)
+    asyncio.run(router.dispatch(SimpleNamespace(callback_query=query), SimpleNamespace()))
+    return query
+
+
+def test_double_tap_on_an_idempotent_route_runs_once():
+    calls = []
+
+    async def register(update, context):
+        calls.append(context.callback_args)
+
+    router = CallbackRouter(dedup_window=60)
+    router.add('register_game', register, int, idempotent=True)
+    tap(router, '1', 7, make_callback('register_game', 3))
+    repeat = tap(router, '2', 7, make_callback('register_game', 3))
+    tap(router, '3', 8, make_callback('register_game', 3))
+
+    assert calls == [(3,), (3,)]
+    assert repeat.answers == ["Already processing this, one moment."]
+    assert router.duplicates == 1
+
+
+def test_redelivered_query_runs_once_on_any_route():
+    calls = []
+
+    async def page(update, context):
+        calls.append(context.callback_args)
+
+    router = CallbackRouter(dedup_window=60)
+    router.add('games_page', page, int)
+    tap(router, '1', 7, make_callback('games_page', 2))
+    tap(router, '1', 7, make_callback('games_page', 2))
+    tap(router, '2', 7, make_callback('games_page', 2))
+
+    assert calls == [(2,), (2,)]
+
+
+def test_a_failed_tap_can_be_retried_at_once():
+    attempts = []
+
+    async def register(update, context):
+        attempts.append(update.callback_query.id)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    router = CallbackRouter(dedup_window=60)
+    router.add('register_game', register, int, idempotent=True)
+    with pytest.raises(RuntimeError):
+        tap(router, '1', 7, make_callback('register_game', 3))
+    retry = tap(router, '2', 7, make_callback('register_game', 3))
+
+    assert attempts == ['1', '2']
+    assert retry.answers == []
+    assert router.duplicates == 0
+
+
+# Largest ids the buttons can carry: INT primary keys, 52-bit Telegram user ids
+MAX_ROW_ID = 2 ** 31 - 1
+MAX_TELEGRAM_ID = 2 ** 52 - 1
+
+
+async def noop(update, context):
+    pass
+
+
+def signed_router():
+    router = CallbackRouter()
+    router.add('confirm_registration', noop, int, int, signed=True)
+    router.add('confirm_remove_game', noop, int, str, signed=True)
+    return router
+
+
+def replace_field(data, index, value):
+    fields = data.split(CALLBACK_SEP)
+    fields[index] = value
+    return CALLBACK_SEP.join(fields)
+
+
+def test_signed_callback_round_trip():
+    data = make_signed_callback('confirm_registration', 7, 12, 345)
+    assert signed_router().parse(data, 7) == (noop, (12, 345))
+
+    data = make_signed_callback('confirm_remove_game', MAX_TELEGRAM_ID, MAX_ROW_ID, 'yes')
+    assert signed_router().parse(data, MAX_TELEGRAM_ID) == (noop, (MAX_ROW_ID, 'yes'))
+
+
+def test_signed_callback_rejects_a_tampered_argument():
+    data = make_signed_callback('confirm_registration', 7, 12, 345)
+    # Point the button at someone else's registration, keeping the signature
+    with pytest.raises(ValueError):
+        signed_router().parse(replace_field(data, 2, 'd'), 7)
+
+
+def test_signed_callback_rejects_a_tampered_signature():
+    data = make_signed_callback('confirm_registration', 7, 12, 345)
+    signature = data.rsplit(CALLBACK_SEP, 1)[1]
+    forged = signature[:-1] + ('A' if signature[-1] != 'A' else 'B')
+    with pytest.raises(ValueError):
+        signed_router().parse(replace_field(data, -1, forged), 7)
+    with pytest.raises(ValueError):
+        signed_router().parse(data.rsplit(CALLBACK_SEP, 1)[0], 7)
+
+
+def test_signed_callback_rejects_another_presser():
+    data = make_signed_callback('confirm_registration', 7, 12, 345)
+    with pytest.raises(PermissionError):
+        signed_router().parse(data, 8)
+    # Re-signing for the presser is impossible without the key, so swapping the owner breaks the signature
+    with pytest.raises(ValueError):
+        signed_router().parse(replace_field(data, -2, '8'), 8)
+
+
+def test_signed_callback_rejects_a_stale_version():
+    data = make_signed_callback('confirm_registration', 7, 12, 345)
+    with pytest.raises(ValueError):
+        signed_router().parse(replace_field(data, 1, '0'), 7)
+
+
+@pytest.mark.parametrize('prefix, args', [
+    ('confirm_registration', (MAX_ROW_ID, MAX_ROW_ID)),
+    ('cancel_reg', (MAX_ROW_ID, MAX_ROW_ID, MAX_ROW_ID)),
+    ('swap_registration', (MAX_ROW_ID, MAX_ROW_ID)),
+    ('confirm_remove_game', (MAX_ROW_ID, 'yes')),
+    ('confirm_remove_player', (MAX_ROW_ID, 'yes')),
+])
+def test_signed_buttons_fit_telegrams_limit_with_the_largest_ids(prefix, args):
+    data = make_signed_callback(prefix, MAX_TELEGRAM_ID, *args)
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_DATA
+
+
+def test_signed_callback_over_the_limit_is_refused():
+    with pytest.raises(ValueError):
+        make_signed_callback('cancel_registration', MAX_TELEGRAM_ID, MAX_ROW_ID, MAX_ROW_ID, MAX_ROW_ID)
@@ -0,0 +1,87 @@
+# test_concurrency.py
+
+import asyncio
+
+from telegram import Bot, Update
+
+from concurrency import PerUserUpdateProcessor
+from fake_telegram import make_message_update
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def message_from(user_id):
+    return Update.de_json(make_message_update(user_id, f"user{user_id}", 'hi'), Bot('123456:TEST'))
+
+
+def test_each_users_updates_run_in_order_in_one_slot():
+    events = []
+
+    async def handle(name, release):
+        events.append(('start', name))
+        await release.wait()
+        events.append(('end', name))
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(2, max_queued_per_user=5)
+        ann, bob = message_from(1), message_from(2)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(processor.process_update(update, handle(name, release)))
+                 for update, name in [(ann, 'ann1'), (ann, 'ann2'), (ann, 'ann3'), (bob, 'bob1')]]
+        await asyncio.sleep(0.01)
+        # Ann's later updates wait behind her first without holding slots, so Bob still gets one
+        started = [name for kind, name in events if kind == 'start']
+        in_use = processor.current_concurrent_updates
+        release.set()
+        await asyncio.gather(*tasks)
+        return started, in_use
+
+    started, in_use = run(scenario())
+    assert started == ['ann1', 'bob1']
+    assert in_use == 2
+    ann_events = [event for event in events if event[1].startswith('ann')]
+    assert ann_events == [('start', 'ann1'), ('end', 'ann1'), ('start', 'ann2'), ('end', 'ann2'),
+                          ('start', 'ann3'), ('end', 'ann3')]
+
+
+def test_updates_beyond_the_per_user_queue_are_dropped():
+    handled = []
+
+    async def handle(number, release):
+        await release.wait()
+        handled.append(number)
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(4, max_queued_per_user=2)
+        ann = message_from(1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(processor.process_update(ann, handle(number, release))) for number in range(5)]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+        return processor
+
+    processor = run(scenario())
+    assert handled == [0, 1, 2]
+    assert processor.dropped == 2
+    assert processor.pending_users() == 0
+
+
+def test_a_failing_update_does_not_stall_the_users_queue():
+    handled = []
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def handle():
+        handled.append('next')
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(1, max_queued_per_user=5)
+        ann = message_from(1)
+        await asyncio.gather(processor.process_update(ann, fail()), processor.process_update(ann, handle()))
+
+    run(scenario())
+    assert handled == ['next']
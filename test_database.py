@@ -0,0 +1,145 @@
+# test_database.py
+
+import mysql.connector
+import pytest
+
+import database
+from database import ConnectionPool, PoolExhaustedError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.in_transaction = False
+        self.pings = 0
+        self.ping_fails = False
+        self.rollback_fails = False
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.ping_fails:
+            raise mysql.connector.OperationalError("MySQL server has gone away")
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise mysql.connector.OperationalError("Lost connection to MySQL server")
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every connection the pool opens, in order."""
+    opened = []
+
+    def connect(**config):
+        opened.append(FakeConnection(len(opened) + 1))
+        return opened[-1]
+
+    monkeypatch.setattr(mysql.connector, 'connect', connect)
+    return opened
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def make_pool(size=2, timeout=0.05, idle_timeout=300, ping_after=30):
+    return ConnectionPool(size, timeout, idle_timeout, ping_after)
+
+
+def test_connections_are_reused_after_close(connections):
+    pool = make_pool()
+    pool.acquire().close()
+    pool.acquire().close()
+
+    assert len(connections) == 1
+    assert pool.stats()['checkouts'] == 2
+    assert pool.stats()['idle'] == 1
+
+
+def test_acquire_times_out_when_every_connection_is_in_use(connections):
+    pool = make_pool(size=1, timeout=0.05)
+    held = pool.acquire()
+
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+    held.close()
+    pool.acquire().close()
+    assert len(connections) == 1
+
+
+def test_idle_connections_past_the_timeout_are_closed(connections, clock):
+    pool = make_pool(idle_timeout=300)
+    pool.acquire().close()
+    clock[0] += 301
+
+    pool.acquire().close()
+
+    assert connections[0].closed
+    assert len(connections) == 2
+    assert pool.stats()['evicted'] == 1
+    assert pool.stats()['open'] == 1
+
+
+def test_connections_idle_past_ping_after_are_checked(connections, clock):
+    pool = make_pool(ping_after=30)
+    pool.acquire().close()
+
+    clock[0] += 10
+    pool.acquire().close()
+    assert connections[0].pings == 0
+
+    clock[0] += 31
+    pool.acquire().close()
+    assert connections[0].pings == 1
+    assert len(connections) == 1
+
+
+def test_a_connection_that_fails_its_ping_is_replaced(connections, clock):
+    pool = make_pool(ping_after=30)
+    pool.acquire().close()
+    connections[0].ping_fails = True
+    clock[0] += 31
+
+    conn = pool.acquire()
+
+    assert conn._conn is connections[1]
+    assert connections[0].closed
+    assert pool.stats()['health_failures'] == 1
+    assert pool.stats()['open'] == 1
+
+
+def test_returning_a_broken_connection_discards_it(connections):
+    pool = make_pool(size=1)
+    conn = pool.acquire()
+    connections[0].in_transaction = True
+    connections[0].rollback_fails = True
+    conn.close()
+
+    assert connections[0].closed
+    assert pool.stats()['open'] == 0
+    assert pool.stats()['idle'] == 0
+    # The slot is free again for a fresh connection
+    pool.acquire().close()
+    assert len(connections) == 2
+
+
+def test_an_open_transaction_is_rolled_back_on_return(connections):
+    pool = make_pool()
+    conn = pool.acquire()
+    connections[0].in_transaction = True
+    conn.close()
+
+    assert not connections[0].in_transaction
+    assert pool.stats()['idle'] == 1
+    with pytest.raises(mysql.connector.InterfaceError):
+        conn.cursor()
@@ -0,0 +1,45 @@
+# test_fake_telegram.py
+
+import asyncio
+
+from telegram import Bot, Update
+
+from fake_telegram import FakeBotApi, FakeTelegramServer, make_callback_update, make_message_update
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_bot_talks_to_the_fake_api():
+    async def scenario():
+        api = FakeBotApi()
+        server = FakeTelegramServer(api, port=0)
+        await server.start()
+        try:
+            async with Bot('123456:TEST', base_url=f"http://127.0.0.1:{server.port}/bot") as bot:
+                await bot.set_webhook('http://127.0.0.1:8443/telegram', secret_token='s3cret')
+                message = await bot.send_message(chat_id=42, text="hello")
+        finally:
+            await server.stop()
+        return api, message
+
+    api, message = run(scenario())
+    assert message.chat.id == 42
+    assert message.text == "hello"
+    assert api.webhook_url == 'http://127.0.0.1:8443/telegram'
+    assert api.count('getMe') == 1
+    assert api.count('sendMessage') == 1
+
+
+def test_synthetic_updates_parse_as_telegram_updates():
+    bot = Bot('123456:TEST')
+    message = Update.de_json(make_message_update(7, 'ann', '/start'), bot)
+    assert message.effective_user.id == 7
+    assert message.message.text == '/start'
+    assert message.message.entities[0].type == 'bot_command'
+
+    tap = Update.de_json(make_callback_update(7, 'ann', 'register_game:3'), bot)
+    assert tap.callback_query.from_user.username == 'ann'
+    assert tap.callback_query.data == 'register_game:3'
+    assert tap.update_id != message.update_id
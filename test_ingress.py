@@ -0,0 +1,151 @@
+# test_ingress.py
+
+import asyncio
+import json
+
+import httpx
+
+from fake_telegram import make_callback_update, make_message_update
+from ingress import MAX_BODY_BYTES, SECRET_HEADER, Ingress, partition_key, worker_urls
+from persistence import SharedStorePersistence
+from shared_store import LocalHub, LocalStore
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def recording_ingress(workers=3, fail=False):
+    """Ingress whose HTTP client records forwarded requests instead of sending them."""
+    forwarded = []
+
+    def handler(request):
+        if fail:
+            raise httpx.ConnectError("worker down", request=request)
+        forwarded.append((str(request.url), request.headers.get(SECRET_HEADER), json.loads(request.content)))
+        return httpx.Response(200)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return Ingress(worker_urls(workers, 8450, 'telegram'), 's3cret', 'telegram', client=client), forwarded
+
+
+def test_worker_urls_follow_worker_index():
+    assert worker_urls(3, 8450, '/telegram/') == [
+        'http://127.0.0.1:8450/telegram',
+        'http://127.0.0.1:8451/telegram',
+        'http://127.0.0.1:8452/telegram',
+    ]
+
+
+def test_partition_key_uses_the_sender_then_the_chat():
+    assert partition_key(make_message_update(7, 'ann', 'hi')) == 7
+    assert partition_key(make_callback_update(8, 'bob', 'register_game:1')) == 8
+    channel_post = {'update_id': 1, 'channel_post': {'message_id': 1, 'date': 0, 'chat': {'id': -100, 'type': 'channel'}}}
+    assert partition_key(channel_post) == -100
+    assert partition_key({'update_id': 1}) is None
+
+
+def test_a_user_always_reaches_the_same_worker():
+    ingress, forwarded = recording_ingress(workers=3)
+
+    async def scenario():
+        updates = [make_message_update(7, 'ann', 'Register'), make_callback_update(7, 'ann', 'register_game:1'),
+                   make_message_update(9, 'cat', 'Register'), make_message_update(7, 'ann', 'C')]
+        statuses = [await ingress.forward(json.dumps(update).encode('utf-8')) for update in updates]
+        await ingress.close()
+        return updates, statuses
+
+    updates, statuses = run(scenario())
+    assert statuses == [200, 200, 200, 200]
+    assert [url for url, _, _ in forwarded] == [
+        'http://127.0.0.1:8451/telegram',  # 7 % 3
+        'http://127.0.0.1:8451/telegram',
+        'http://127.0.0.1:8450/telegram',  # 9 % 3
+        'http://127.0.0.1:8451/telegram',
+    ]
+    # Order within a user and the secret header are preserved
+    assert [body['update_id'] for _, _, body in forwarded] == [update['update_id'] for update in updates]
+    assert {secret for _, secret, _ in forwarded} == {'s3cret'}
+    assert ingress.forwarded == [1, 3, 0]
+
+
+def test_unreachable_worker_asks_telegram_to_redeliver():
+    ingress, _ = recording_ingress(fail=True)
+
+    async def scenario():
+        status = await ingress.forward(json.dumps(make_message_update(7, 'ann', 'hi')).encode('utf-8'))
+        await ingress.close()
+        return status
+
+    assert run(scenario()) == 502
+
+
+def test_requests_without_the_secret_are_rejected():
+    ingress, forwarded = recording_ingress()
+
+    async def post(port, headers):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        body = json.dumps(make_message_update(7, 'ann', 'hi')).encode('utf-8')
+        head = f"POST /telegram HTTP/1.1\r\nContent-Length: {len(body)}\r\n{headers}\r\n"
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+
+    async def scenario():
+        server = await asyncio.start_server(ingress.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            statuses = (await post(port, "X-Telegram-Bot-Api-Secret-Token: wrong\r\n"),
+                        await post(port, "X-Telegram-Bot-Api-Secret-Token: s3cret\r\n"))
+        await ingress.close()
+        return statuses
+
+    assert run(scenario()) == (403, 200)
+    assert len(forwarded) == 1
+
+
+def test_oversized_or_unauthenticated_bodies_are_refused_unread():
+    ingress, forwarded = recording_ingress()
+
+    async def post_headers(port, length, secret):
+        # Announce a body but never send it: the answer must not wait for it
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        head = (f"POST /telegram HTTP/1.1\r\nContent-Length: {length}\r\n"
+                f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n\r\n")
+        writer.write(head.encode('latin-1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout=2)
+        writer.close()
+        return int(status_line.split()[1])
+
+    async def scenario():
+        server = await asyncio.start_server(ingress.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            statuses = (await post_headers(port, 10 ** 9, 'wrong'),
+                        await post_headers(port, MAX_BODY_BYTES + 1, 's3cret'),
+                        await post_headers(port, 'lots', 's3cret'))
+        await ingress.close()
+        return statuses
+
+    assert run(scenario()) == (403, 413, 400)
+    assert forwarded == []
+
+
+def test_another_worker_picks_up_a_users_session():
+    hub = LocalHub()
+
+    async def scenario():
+        worker_a = SharedStorePersistence(LocalStore('a', hub))
+        await worker_a.update_user_data(7, {'input_state': ('add_player', 123.0)})
+        await worker_a.update_conversation('registration', (7, 7), 1)
+        await worker_a.flush()
+
+        worker_b = SharedStorePersistence(LocalStore('b', hub))
+        return await worker_b.get_user_data(), await worker_b.get_conversations('registration')
+
+    user_data, conversations = run(scenario())
+    assert dict(user_data) == {7: {'input_state': ('add_player', 123.0)}}
+    assert conversations == {(7, 7): 1}
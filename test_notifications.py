@@ -0,0 +1,34 @@
+# test_notifications.py
+
+import asyncio
+
+from notifications import NotificationQueue
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+
+def test_chat_slots_are_dropped_once_they_pass():
+    bot = FakeBot()
+
+    async def scenario():
+        queue = NotificationQueue(1000, 0.01, 1, 300, 10)
+        queue.start(bot)
+        for chat_id in range(100):
+            queue.enqueue(chat_id, "Courts are closed today")
+        await asyncio.sleep(0.3)
+        queue.enqueue(1000, "Courts are closed today")
+        await asyncio.sleep(0.05)
+        throttled = queue.stats()['throttled_chats']
+        await queue.stop()
+        return throttled
+
+    throttled = asyncio.run(scenario())
+    assert len(bot.sent) == 101
+    # Only the chat messaged last can still be inside its per-chat interval
+    assert throttled <= 1
@@ -0,0 +1,58 @@
+# test_persistence.py
+
+import asyncio
+
+from persistence import SQLitePersistence
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_sqlite_restores_user_data_and_conversations_after_restart(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+
+    async def before_restart():
+        persistence = SQLitePersistence(path)
+        await persistence.update_user_data(7, {'input_state': ('add_player', 123.0), 'name': 'Ann'})
+        await persistence.update_user_data(8, {'name': 'Bob'})
+        await persistence.update_conversation('registration', (7, 7), 1)
+        await persistence.update_conversation('edit_game', (8, 8), 2)
+        await persistence.drop_user_data(8)
+        await persistence.update_conversation('edit_game', (8, 8), None)
+        await persistence.flush()
+
+    async def after_restart():
+        persistence = SQLitePersistence(path)
+        try:
+            return (await persistence.get_user_data(),
+                    await persistence.get_conversations('registration'),
+                    await persistence.get_conversations('edit_game'))
+        finally:
+            await persistence.flush()
+
+    run(before_restart())
+    user_data, registration, edit_game = run(after_restart())
+    assert dict(user_data) == {7: {'input_state': ('add_player', 123.0), 'name': 'Ann'}}
+    assert registration == {(7, 7): 1}
+    assert edit_game == {}
+
+
+def test_sqlite_writes_a_burst_of_updates_in_one_batch(tmp_path):
+    batches = []
+
+    class RecordingPersistence(SQLitePersistence):
+        async def _write_batch(self, user_data, conversations):
+            batches.append((dict(user_data), dict(conversations)))
+            await super()._write_batch(user_data, conversations)
+
+    async def scenario():
+        persistence = RecordingPersistence(str(tmp_path / 'state.sqlite3'))
+        for user_id in range(5):
+            await persistence.update_user_data(user_id, {'n': user_id})
+        await asyncio.sleep(0.1)
+        await persistence.flush()
+
+    run(scenario())
+    assert len(batches) == 1
+    assert sorted(batches[0][0]) == [0, 1, 2, 3, 4]
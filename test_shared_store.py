@@ -0,0 +1,31 @@
+# test_shared_store.py
+
+import json
+
+from shared_store import MySQLStore
+
+
+def event(event_id, origin='b', channel='schedule'):
+    return (event_id, origin, channel, json.dumps({'id': event_id}))
+
+
+def test_an_event_committed_after_a_later_one_is_still_delivered():
+    store = MySQLStore('a', poll_interval=1, lookback=100)
+    store._last_event_id = 10
+
+    # Id 12 commits before id 11; the next poll re-reads the trailing window
+    first = store._unseen([event(12)])
+    second = store._unseen([event(11), event(12), event(13, origin='a')])
+
+    assert first == [('schedule', {'id': 12})]
+    assert second == [('schedule', {'id': 11})]
+    assert store._last_event_id == 13
+
+
+def test_seen_ids_are_forgotten_below_the_lookback_window():
+    store = MySQLStore('a', poll_interval=1, lookback=5)
+    store._last_event_id = 0
+
+    store._unseen([event(event_id) for event_id in range(1, 21)])
+
+    assert store._seen == set(range(16, 21))
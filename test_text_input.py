@@ -0,0 +1,44 @@
+# test_text_input.py
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+from text_input import INPUT_STATE_KEY, TextInputDispatcher
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def send(dispatcher, context):
+    update = SimpleNamespace(message=FakeMessage())
+    result = asyncio.run(dispatcher.dispatch(update, context))
+    return result, update.message.replies
+
+
+def test_each_state_expires_after_its_own_timeout():
+    async def step(update, context):
+        return 'handled'
+
+    dispatcher = TextInputDispatcher(600)
+    dispatcher.register('edit_game_attribute', step, timeout=120)
+    dispatcher.register('player_registration', step)
+    assert dispatcher.timeout_for('edit_game_attribute') == 120
+    assert dispatcher.timeout_for('player_registration') == 600
+
+    # Started five minutes ago: too old for a quick edit, fine for registration
+    started = time.time() - 300
+    edit = SimpleNamespace(user_data={INPUT_STATE_KEY: ('edit_game_attribute', started + 120)})
+    registration = SimpleNamespace(user_data={INPUT_STATE_KEY: ('player_registration', started + 600)})
+
+    result, replies = send(dispatcher, edit)
+    assert result is None
+    assert INPUT_STATE_KEY not in edit.user_data
+    assert replies == ["That took too long and the previous step has expired. Please start again."]
+
+    assert send(dispatcher, registration) == ('handled', [])
@@ -0,0 +1,72 @@
+# text_input.py
+
+import logging
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import TEXT_INPUT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# user_data key holding the compact (state, expires_at) record
+INPUT_STATE_KEY = 'input_state'
+
+
+def set_input_state(context: ContextTypes.DEFAULT_TYPE, state, timeout=None):
+    """Mark that the user's next free-text message belongs to the given step."""
+    if timeout is None:
+        timeout = text_input_dispatcher.timeout_for(state)
+    context.user_data[INPUT_STATE_KEY] = (state, time.time() + timeout)
+
+
+def clear_input_state(context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop(INPUT_STATE_KEY, None)
+
+
+class TextInputDispatcher:
+    """Route free-text messages straight to the step function of the user's pending input state.
+
+    Replaces a stack of catch-all MessageHandlers, of which only the first
+    could ever run. Each state has its own timeout; expired states are
+    dropped and the user is asked to start again.
+    """
+
+    def __init__(self, default_timeout):
+        self.default_timeout = default_timeout
+        self._steps = {}
+
+    def register(self, state, step, timeout=None):
+        if state in self._steps and self._steps[state][0] is not step:
+            raise ValueError(f"Text input state {state!r} is already registered")
+        self._steps[state] = (step, timeout if timeout is not None else self.default_timeout)
+
+    def instrument(self, wrap):
+        """Replace every step function with wrap(step), e.g. to time it."""
+        self._steps = {state: (wrap(step), timeout) for state, (step, timeout) in self._steps.items()}
+
+    def timeout_for(self, state):
+        step = self._steps.get(state)
+        return step[1] if step else self.default_timeout
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        record = context.user_data.get(INPUT_STATE_KEY)
+        if record is None:
+            return None
+
+        state, expires_at = record
+        if expires_at < time.time():
+            clear_input_state(context)
+            await update.message.reply_text("That took too long and the previous step has expired. Please start again.")
+            return None
+
+        step = self._steps.get(state)
+        if step is None:
+            logger.warning(f"No step registered for text input state {state!r}")
+            clear_input_state(context)
+            return None
+        return await step[0](update, context)
+
+
+text_input_dispatcher = TextInputDispatcher(TEXT_INPUT_TIMEOUT)
@@ -1,4 +1,4 @@
-from database import get_player_by_nickname
+from player_cache import get_current_player
 import datetime
 
 #ADMIN_USERNAMES = ["admin_username1", "admin_username2"]
@@ -6,9 +6,8 @@ import datetime
 def is_admin(username):
     return username in ADMIN_USERNAMES
 
-def is_registered_player(nickname):
-    player = get_player_by_nickname(nickname)
-    return player is not None
+def is_registered_player(context):
+    return get_current_player(context) is not None
     
 def format_timedelta(td):
     total_seconds = int(td.total_seconds())